@@ -1,6 +1,12 @@
+from functools import partial
+
 from django.contrib import admin
+from django.db import transaction
+from django.db.models import F
+from django.db.models.functions import Greatest
 
-from .models import Comment, News
+from .cache import bump_comments_version
+from .models import BadWord, Comment, News
 
 
 class CommentInline(admin.StackedInline):
@@ -10,6 +16,29 @@ class CommentInline(admin.StackedInline):
 
 @admin.register(News)
 class NewsAdmin(admin.ModelAdmin):
+    list_display = ('title', 'date', 'comment_count')
     inlines = [
         CommentInline,
     ]
+
+    def save_formset(self, request, form, formset, change):
+        """
+        Комментарии из вкладки учитываются в счётчике так же, как с сайта.
+
+        Админка сохраняет форму в транзакции, поэтому счётчик меняется
+        вместе с комментариями.
+        """
+        super().save_formset(request, form, formset, change)
+        if formset.model is not Comment:
+            return
+        news_id = form.instance.pk
+        delta = len(formset.new_objects) - len(formset.deleted_objects)
+        if delta:
+            News.objects.filter(pk=news_id).update(
+                comment_count=Greatest(F('comment_count') + delta, 0)
+            )
+        if delta or formset.changed_objects or formset.deleted_objects:
+            transaction.on_commit(partial(bump_comments_version, news_id))
+
+
+admin.site.register(BadWord)
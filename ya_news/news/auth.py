@@ -0,0 +1,51 @@
+"""
+Пользователь запроса из кэша.
+
+AuthenticationMiddleware на каждом запросе достаёт пользователя из базы.
+CachedModelBackend держит в двухуровневом кэше слепок его полей и
+собирает пользователя без запроса. Слепок удаляется при сохранении и
+удалении пользователя (в том числе при смене пароля) и при выходе.
+QuerySet.update() сигналов не посылает: после массовой правки
+пользователей вызывайте invalidate_user для каждого из них, иначе
+слепок проживёт до AUTH_USER_CACHE_TIMEOUT.
+"""
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.contrib.auth.backends import ModelBackend
+from django.db import DEFAULT_DB_ALIAS
+
+from yanews.twotier import TwoTierCache
+
+USER_KEY = 'auth:user:{user_id}'
+
+user_cache = TwoTierCache('users')
+
+
+def snapshot(user):
+    """Значения полей пользователя без связанных объектов."""
+    return {
+        field.attname: field.value_from_object(user)
+        for field in user._meta.concrete_fields
+    }
+
+
+def invalidate_user(user_id):
+    user_cache.delete(USER_KEY.format(user_id=user_id))
+
+
+class CachedModelBackend(ModelBackend):
+
+    def get_user(self, user_id):
+        key = USER_KEY.format(user_id=user_id)
+        data = user_cache.get(key)
+        if data is None:
+            user = super().get_user(user_id)
+            if user is not None:
+                user_cache.set(
+                    key, snapshot(user), settings.AUTH_USER_CACHE_TIMEOUT
+                )
+            return user
+        user = get_user_model().from_db(
+            DEFAULT_DB_ALIAS, list(data), list(data.values())
+        )
+        return user if self.user_can_authenticate(user) else None
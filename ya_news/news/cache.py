@@ -0,0 +1,194 @@
+import hashlib
+import time
+from http import HTTPStatus
+
+from django.conf import settings
+from django.core.cache import cache
+from django.template.loader import render_to_string
+from django.utils.cache import get_conditional_response, patch_vary_headers
+from django.utils.http import http_date, parse_http_date_safe, quote_etag
+
+from yanews.twotier import TwoTierCache, Uncacheable
+
+CONTENT_VERSION_KEY = 'news:content:version'
+COMMENTS_VERSION_KEY = 'news:{news_id}:comments:version'
+COMMENTS_PAGE_KEY = 'news:{news_id}:comments:{version}:{cursor}'
+PAGE_KEY = 'news:page:{version}:{path}'
+
+page_cache = TwoTierCache('pages')
+
+
+def get_version(key):
+    """
+    Текущая версия группы ключей.
+
+    Начальное значение берётся из часов, а не равно единице: если ключ
+    версии вытеснят из кэша, новая версия не совпадёт со старыми
+    записями, и устаревший HTML не будет найден.
+    """
+    return cache.get_or_set(key, time.time_ns, None)
+
+
+def bump_version(key):
+    """Делает недействительными все записи группы."""
+    try:
+        cache.incr(key)
+    except ValueError:
+        cache.set(key, time.time_ns(), None)
+
+
+def get_comments_version(news_id):
+    return get_version(COMMENTS_VERSION_KEY.format(news_id=news_id))
+
+
+def bump_comments_version(news_id):
+    """Комментарии изменились: устарели и их фрагменты, и целые страницы."""
+    bump_version(COMMENTS_VERSION_KEY.format(news_id=news_id))
+    bump_content_version()
+
+
+def get_content_version():
+    """
+    Версия содержимого сайта — целые секунды его последнего изменения.
+
+    Она же служит заголовком Last-Modified закэшированных страниц.
+    """
+    return cache.get_or_set(CONTENT_VERSION_KEY, now_seconds, None)
+
+
+def bump_content_version():
+    """
+    Сдвигает версию содержимого хотя бы на секунду вперёд.
+
+    Last-Modified сравнивается с точностью до секунды, поэтому две
+    версии одной секунды дали бы клиенту 304 на устаревшую страницу.
+    При частых правках версия может уйти вперёд часов; тогда
+    Last-Modified не отдаётся, а проверка идёт только по ETag.
+    """
+    now = now_seconds()
+    try:
+        version = cache.incr(CONTENT_VERSION_KEY)
+    except ValueError:
+        version = None
+    if version is None or version < now:
+        cache.set(CONTENT_VERSION_KEY, now, None)
+
+
+def now_seconds():
+    return int(time.time())
+
+
+def render_comment_chunks(comments):
+    """
+    HTML каждого комментария без элементов управления.
+
+    Ссылки «Редактировать» и «Удалить» зависят от пользователя,
+    поэтому шаблон добавляет их поверх готового фрагмента.
+    """
+    return [
+        {
+            'pk': comment.pk,
+            'author_id': comment.author_id,
+            'html': render_to_string(
+                'includes/comment.html', {'comment': comment}
+            ),
+        }
+        for comment in comments
+    ]
+
+
+def get_comment_page(news_id, cursor, build_page):
+    """
+    Страница комментариев из кэша или, при промахе, из build_page().
+
+    build_page возвращает пару (комментарии, курсор следующей страницы).
+    """
+    key = COMMENTS_PAGE_KEY.format(
+        news_id=news_id,
+        version=get_comments_version(news_id),
+        cursor=cursor or '',
+    )
+    page = cache.get(key)
+    if page is None:
+        comments, next_cursor = build_page()
+        page = (render_comment_chunks(comments), next_cursor)
+        cache.set(key, page, settings.COMMENTS_CACHE_TIMEOUT)
+    return page
+
+
+def get_page_cache_key(request, version):
+    return PAGE_KEY.format(
+        version=version,
+        path=hashlib.md5(request.get_full_path().encode()).hexdigest(),
+    )
+
+
+def conditional_page(request, response):
+    """Ответ 304, если у клиента уже есть эта версия страницы."""
+    return get_conditional_response(
+        request,
+        etag=response['ETag'],
+        last_modified=parse_http_date_safe(response.get('Last-Modified')),
+        response=response,
+    )
+
+
+def get_cached_page(request, render_page):
+    """
+    Готовая страница для анонимного пользователя.
+
+    Ключ состоит из адреса и версии содержимого сайта. При промахе
+    страница строится вызовом render_page() один раз на все процессы.
+    Last-Modified берётся из той же версии, что и ключ, так что любая
+    правка новости или комментария меняет и ETag, и Last-Modified.
+    Ответы не 200 и с cookie не кэшируются и уходят как есть. На
+    условный запрос со совпавшими ETag или Last-Modified отвечаем 304,
+    не трогая ни базу, ни шаблоны.
+    """
+    version = get_content_version()
+
+    def build_page():
+        response = render_page()
+        if response.status_code != HTTPStatus.OK:
+            raise Uncacheable(response)
+        if hasattr(response, 'render'):
+            response.render()
+        if response.cookies:
+            raise Uncacheable(response)
+        response['ETag'] = quote_etag(
+            hashlib.md5(response.content).hexdigest()
+        )
+        if version <= now_seconds():
+            response['Last-Modified'] = http_date(version)
+        patch_vary_headers(response, ('Cookie',))
+        return response
+
+    response = page_cache.get_or_set(
+        get_page_cache_key(request, version),
+        build_page,
+        settings.NEWS_PAGE_CACHE_TIMEOUT,
+    )
+    if not response.has_header('ETag'):
+        return response
+    return conditional_page(request, response)
+
+
+def find_cached_page(request):
+    """
+    Страница из кэша без обращения к базе и сессии.
+
+    Годится только для запросов без сессионной cookie: такой
+    пользователь заведомо анонимный. Промах возвращает None.
+    """
+    if not (
+        settings.NEWS_PAGE_CACHE_ENABLED
+        and request.method in ('GET', 'HEAD')
+        and settings.SESSION_COOKIE_NAME not in request.COOKIES
+    ):
+        return None
+    response = page_cache.get(
+        get_page_cache_key(request, get_content_version())
+    )
+    if response is None:
+        return None
+    return conditional_page(request, response)
@@ -0,0 +1,115 @@
+"""
+Групповая запись комментариев.
+
+SQLite допускает одного пишущего, и при наплыве комментариев каждый
+запрос ждёт своей транзакции, а часть получает «database is locked».
+Здесь запросы только кладут проверенный комментарий в очередь и ждут
+результата, а один фоновый поток вставляет всё накопившееся одной
+транзакцией: одна фиксация на пачку вместо одной на комментарий.
+"""
+import queue
+import threading
+from collections import Counter
+from concurrent.futures import Future
+from functools import partial
+
+from django.conf import settings
+from django.db import DatabaseError, close_old_connections, transaction
+from django.db.models import F
+
+from .cache import bump_comments_version
+from .models import Comment, News
+
+
+def write_comments(comments):
+    """Вставляет пачку комментариев и обновляет счётчики новостей."""
+    per_news = Counter(comment.news_id for comment in comments)
+    with transaction.atomic():
+        Comment.objects.bulk_create(comments)
+        for news_id, count in per_news.items():
+            News.objects.filter(pk=news_id).update(
+                comment_count=F('comment_count') + count
+            )
+            transaction.on_commit(partial(bump_comments_version, news_id))
+
+
+class CommentWriter:
+    """
+    Очередь комментариев с фоновым потоком записи.
+
+    Поток берёт первый комментарий из очереди и всё, что успело
+    накопиться за ним, но не больше batch_size. Пока идёт запись,
+    очередь снова наполняется, так что размер пачки растёт вместе
+    с нагрузкой без искусственных задержек.
+    """
+
+    def __init__(self, batch_size):
+        self.batch_size = batch_size
+        self.queue = queue.Queue()
+        self.lock = threading.Lock()
+        self.thread = None
+
+    def submit(self, comment):
+        """Ставит комментарий в очередь; результат придёт во Future."""
+        self._ensure_started()
+        future = Future()
+        self.queue.put((comment, future))
+        return future
+
+    def _ensure_started(self):
+        with self.lock:
+            if self.thread is None or not self.thread.is_alive():
+                self.thread = threading.Thread(
+                    target=self._run, name='comment-writer', daemon=True
+                )
+                self.thread.start()
+
+    def _collect(self):
+        batch = [self.queue.get()]
+        while len(batch) < self.batch_size:
+            try:
+                batch.append(self.queue.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        """
+        Цикл записи; любая ошибка достаётся ожидающим запросам пачки.
+
+        Поток при этом продолжает работу, иначе пачка и все следующие
+        комментарии ждали бы до NEWS_COMMENT_WRITE_TIMEOUT.
+        """
+        while True:
+            batch = self._collect()
+            try:
+                self._flush(batch)
+            except Exception as error:
+                for _, future in batch:
+                    if not future.done():
+                        future.set_exception(error)
+            finally:
+                close_old_connections()
+
+    def _flush(self, batch):
+        """
+        Записывает пачку целиком.
+
+        Если пачка не прошла (например, новость удалили, пока комментарий
+        ждал в очереди), пишем комментарии по одному, чтобы ошибку
+        получил только виновник.
+        """
+        try:
+            write_comments([comment for comment, _ in batch])
+        except DatabaseError as error:
+            if len(batch) == 1:
+                batch[0][1].set_exception(error)
+                return
+            for item in batch:
+                self._flush([item])
+            return
+        for _, future in batch:
+            future.set_result(None)
+
+
+comment_writer = CommentWriter(settings.NEWS_COMMENT_BATCH_SIZE)
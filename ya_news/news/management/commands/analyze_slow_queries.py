@@ -0,0 +1,60 @@
+from pathlib import Path
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from yanews.slowlog import full_scans, read_log, suggest_index
+
+TEMP_SORT = 'USE TEMP B-TREE FOR ORDER BY'
+
+
+class Command(BaseCommand):
+    help = (
+        'Группирует журнал медленных запросов по нормализованному SQL, '
+        'отмечает полные просмотры таблиц и подсказывает индексы.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--log',
+            type=Path,
+            help='Журнал; по умолчанию SLOW_QUERY_LOG.',
+        )
+        parser.add_argument(
+            '--limit',
+            type=int,
+            default=20,
+            help='Сколько групп с наибольшим суммарным временем показать.',
+        )
+
+    def handle(self, *args, **options):
+        path = options['log'] or settings.SLOW_QUERY_LOG
+        try:
+            groups = read_log(path)
+        except FileNotFoundError:
+            raise CommandError(f'Журнал {path} не найден.')
+        ranked = sorted(
+            groups.items(), key=lambda item: item[1]['total_ms'], reverse=True
+        )
+        for sql, group in ranked[:options['limit']]:
+            self.stdout.write(
+                f'[{group["count"]} раз, всего {group["total_ms"]:.1f} мс, '
+                f'макс {group["max_ms"]:.1f} мс] '
+                + ', '.join(sorted(group['url_names']))
+            )
+            self.stdout.write(f'  {sql}')
+            if group['plan']:
+                self.stdout.write(
+                    '  план: ' + '; '.join(sorted(group['plan']))
+                )
+            if TEMP_SORT in group['plan']:
+                self.stdout.write('  сортировка без индекса')
+            for table in full_scans(group['plan']):
+                self.stdout.write(f'  полный просмотр {table}')
+                suggestion = suggest_index(sql, table)
+                if suggestion is not None:
+                    model, fields = suggestion
+                    self.stdout.write(
+                        f'  индекс: models.Index(fields={fields!r}) '
+                        f'в {model._meta.label}'
+                    )
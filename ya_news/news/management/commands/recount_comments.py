@@ -0,0 +1,50 @@
+from django.core.management.base import BaseCommand
+from django.db import models, transaction
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+from news.models import Comment, News
+
+BATCH_SIZE = 1000
+
+
+class Command(BaseCommand):
+    help = 'Пересчитывает сохранённые счётчики комментариев у новостей.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=BATCH_SIZE,
+            help='Сколько новостей обновлять в одной транзакции.',
+        )
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        comment_count = Coalesce(
+            Subquery(
+                Comment.objects.filter(
+                    news=OuterRef('pk')
+                ).order_by().values('news').annotate(
+                    count=Count('pk')
+                ).values('count'),
+                output_field=models.IntegerField(),
+            ),
+            0,
+        )
+        last_pk = 0
+        updated = 0
+        while True:
+            batch = list(
+                News.objects.filter(pk__gt=last_pk).order_by(
+                    'pk'
+                ).values_list('pk', flat=True)[:batch_size]
+            )
+            if not batch:
+                break
+            with transaction.atomic():
+                updated += News.objects.filter(pk__in=batch).update(
+                    comment_count=comment_count
+                )
+            last_pk = batch[-1]
+        self.stdout.write(f'Пересчитано новостей: {updated}')
@@ -0,0 +1,89 @@
+import base64
+import binascii
+import json
+from collections import namedtuple
+
+from django.core.exceptions import ValidationError
+from django.db.models import Q
+
+KeysetPage = namedtuple('KeysetPage', ('object_list', 'next_cursor'))
+
+
+class InvalidCursor(Exception):
+    """Курсор не удалось разобрать."""
+
+
+class KeysetPaginator:
+    """
+    Постраничный вывод по курсору вместо OFFSET.
+
+    Курсор хранит значения полей сортировки последнего объекта страницы.
+    Следующая страница выбирается условием «после курсора», которое
+    обслуживается составным индексом по тем же полям, поэтому любая
+    страница стоит столько же, сколько первая.
+    Все поля сортировки должны идти в одном направлении.
+    """
+
+    def __init__(self, queryset, ordering, per_page):
+        self.queryset = queryset.order_by(*ordering)
+        self.per_page = per_page
+        self.lookup = 'lt' if ordering[0].startswith('-') else 'gt'
+        self.fields = [
+            queryset.model._meta.get_field(name.lstrip('-'))
+            for name in ordering
+        ]
+
+    def encode_cursor(self, obj):
+        values = [field.value_to_string(obj) for field in self.fields]
+        return base64.urlsafe_b64encode(
+            json.dumps(values).encode()
+        ).decode()
+
+    def decode_cursor(self, cursor):
+        try:
+            values = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+            if len(values) != len(self.fields):
+                raise InvalidCursor(cursor)
+            return [
+                field.to_python(value)
+                for field, value in zip(self.fields, values)
+            ]
+        except (binascii.Error, ValueError, TypeError, ValidationError):
+            raise InvalidCursor(cursor)
+
+    def normalize_cursor(self, cursor):
+        """
+        Курсор в каноническом виде.
+
+        Декодер base64 пропускает посторонние символы, поэтому у одной
+        позиции бесконечно много записей; ключи кэша строятся только
+        по канонической.
+        """
+        values = self.decode_cursor(cursor)
+        return self.encode_cursor(self.queryset.model(**{
+            field.attname: value for field, value in zip(self.fields, values)
+        }))
+
+    def after(self, values):
+        """Условие «строго после курсора» в порядке сортировки."""
+        condition = Q()
+        for index, field in enumerate(self.fields):
+            equal = {
+                previous.name: value
+                for previous, value in zip(self.fields[:index], values)
+            }
+            condition |= Q(
+                **equal, **{f'{field.name}__{self.lookup}': values[index]}
+            )
+        return condition
+
+    def get_page(self, cursor=None):
+        queryset = self.queryset
+        if cursor:
+            queryset = queryset.filter(self.after(self.decode_cursor(cursor)))
+        object_list = list(queryset[:self.per_page + 1])
+        next_cursor = None
+        if len(object_list) > self.per_page:
+            object_list = object_list[:self.per_page]
+            next_cursor = self.encode_cursor(object_list[-1])
+        return KeysetPage(object_list, next_cursor)
@@ -0,0 +1,100 @@
+from collections import deque
+from itertools import groupby
+
+from .cache import get_version
+from .models import BadWord
+
+BAD_WORDS_VERSION_KEY = 'news:bad_words:version'
+
+# Латинские буквы, которыми подменяют похожие кириллические.
+LOOKALIKES = str.maketrans({
+    'a': 'а', 'b': 'в', 'c': 'с', 'e': 'е', 'h': 'н', 'k': 'к', 'm': 'м',
+    'o': 'о', 'p': 'р', 't': 'т', 'x': 'х', 'y': 'у', 'ё': 'е',
+})
+
+
+def normalize(text):
+    """
+    Приводит текст к виду, в котором сравниваются слова.
+
+    Нижний регистр, «ё» как «е», латинские двойники как кириллица,
+    повторы одной буквы схлопываются: «РедииCка» → «редиска».
+    """
+    text = text.lower().translate(LOOKALIKES)
+    return ''.join(char for char, _ in groupby(text))
+
+
+class WordMatcher:
+    """
+    Автомат Ахо — Корасик по списку слов.
+
+    Строится один раз, после чего все слова ищутся за один проход
+    по тексту, независимо от длины списка.
+    """
+
+    def __init__(self, words):
+        self.goto = [{}]
+        self.fail = [0]
+        self.output = [False]
+        for word in words:
+            self._add(normalize(word))
+        self._link()
+
+    def _add(self, word):
+        if not word:
+            return
+        state = 0
+        for char in word:
+            if char not in self.goto[state]:
+                self.goto.append({})
+                self.fail.append(0)
+                self.output.append(False)
+                self.goto[state][char] = len(self.goto) - 1
+            state = self.goto[state][char]
+        self.output[state] = True
+
+    def _link(self):
+        """Суффиксные ссылки, проставляемые обходом бора в ширину."""
+        queue = deque(self.goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for char, child in self.goto[state].items():
+                queue.append(child)
+                fallback = self.fail[state]
+                while fallback and char not in self.goto[fallback]:
+                    fallback = self.fail[fallback]
+                self.fail[child] = self.goto[fallback].get(char, 0)
+                self.output[child] |= self.output[self.fail[child]]
+
+    def search(self, text):
+        """Есть ли в тексте хотя бы одно слово из списка."""
+        state = 0
+        for char in normalize(text):
+            while state and char not in self.goto[state]:
+                state = self.fail[state]
+            state = self.goto[state].get(char, 0)
+            if self.output[state]:
+                return True
+        return False
+
+
+_matcher = (None, None)
+
+
+def get_matcher(words):
+    """
+    Автомат для встроенного списка и слов из таблицы BadWord.
+
+    Собирается один раз на процесс и пересобирается, только когда
+    меняется версия списка в кэше по умолчанию. Другие процессы видят
+    новую версию, только если этот кэш у них общий.
+    """
+    global _matcher
+    version = get_version(BAD_WORDS_VERSION_KEY)
+    built_version, matcher = _matcher
+    if built_version != version:
+        matcher = WordMatcher(
+            [*words, *BadWord.objects.values_list('word', flat=True)]
+        )
+        _matcher = (version, matcher)
+    return matcher
@@ -2,15 +2,24 @@ import datetime
 import pytest
 
 from django.conf import settings
+from django.core.cache import cache
 from django.urls import reverse
 from django.utils import timezone
 
 from news.forms import BAD_WORDS
 from news.models import Comment, News
+from yanews.twotier import REGISTRY
 
 CREATE_MANY_COMMENTS_COUNT = 5
 
 
+@pytest.fixture(autouse=True)
+def clear_cache():
+    cache.clear()
+    for two_tier_cache in REGISTRY.values():
+        two_tier_cache.clear_local()
+
+
 @pytest.fixture
 def author(django_user_model):
     return django_user_model.objects.create(username='Автор')
@@ -82,6 +91,11 @@ def detail_url(news):
     return reverse('news:detail', args=(news.pk,))
 
 
+@pytest.fixture
+def comments_url(news):
+    return reverse('news:comments', args=(news.pk,))
+
+
 @pytest.fixture
 def delete_url(comment):
     return reverse('news:delete', args=(comment.pk,))
@@ -1,15 +1,27 @@
+import threading
+
 import pytest
+from asgiref.sync import async_to_sync
+from django.contrib.auth.models import AnonymousUser
+from django.core.management import call_command
+from django.http import HttpResponse
 from django.urls import reverse
 from django.conf import settings
 
 from news.forms import CommentForm
+from news.models import Comment, News
+from news.views import NewsList, async_read_view
+from yanews.metrics import QueryCounter
 
 pytestmark = pytest.mark.django_db
 
 HOME_URL = reverse('news:home')
+ARCHIVE_URL = reverse('news:archive')
+ARCHIVE_PAGE_SIZE = 3
 DETAIL_URL = pytest.lazy_fixture('detail_url')
 ANONYMOUS_CLIENT = pytest.lazy_fixture('client')
 REGISTERED_CLIENT = pytest.lazy_fixture('author_client')
+COMMENTS_PER_NEWS = 3
 
 
 @pytest.mark.usefixtures('many_news')
@@ -25,6 +37,70 @@ def test_news_order(client):
     assert all_dates == sorted(all_dates, reverse=True)
 
 
+@pytest.mark.django_db(transaction=True)
+@pytest.mark.usefixtures('many_news')
+def test_async_news_list_matches_sync(rf):
+    request = rf.get(HOME_URL)
+    request.user = AnonymousUser()
+    sync_response = NewsList.as_view()(request).render()
+    async_response = async_to_sync(
+        async_read_view(NewsList.as_view())
+    )(request)
+    assert async_response.content == sync_response.content
+
+
+@pytest.mark.django_db(transaction=True)
+def test_async_view_queries_reach_request_wrappers(rf):
+    counter = QueryCounter()
+    request = rf.get(HOME_URL)
+    request.user = AnonymousUser()
+    request.db_execute_wrappers = [counter]
+    async_to_sync(async_read_view(NewsList.as_view()))(request)
+    assert counter.count > 0
+
+
+def test_async_wrapper_keeps_writes_off_read_pool(rf):
+    threads = []
+
+    def view(request):
+        threads.append(threading.current_thread().name)
+        return HttpResponse()
+
+    async_to_sync(async_read_view(view))(rf.post(HOME_URL))
+    assert not threads[0].startswith('news-db')
+
+
+@pytest.mark.usefixtures('many_news')
+def test_archive_pages_cover_all_news(client, settings):
+    settings.NEWS_COUNT_ON_ARCHIVE_PAGE = ARCHIVE_PAGE_SIZE
+    archive = []
+    context = client.get(ARCHIVE_URL).context
+    archive += context['object_list']
+    while context['next_cursor']:
+        context = client.get(
+            ARCHIVE_URL, {'cursor': context['next_cursor']}
+        ).context
+        assert len(context['object_list']) <= ARCHIVE_PAGE_SIZE
+        archive += context['object_list']
+    assert archive == list(News.objects.order_by('-date', '-id'))
+
+
+@pytest.mark.usefixtures('many_news')
+def test_news_comment_count_in_single_query(
+        client, author, django_assert_num_queries):
+    Comment.objects.bulk_create(
+        Comment(news=news, author=author, text=f'Текст {index}')
+        for news in News.objects.all()
+        for index in range(COMMENTS_PER_NEWS)
+    )
+    call_command('recount_comments')
+    with django_assert_num_queries(1):
+        object_list = client.get(HOME_URL).context['object_list']
+    assert all(
+        news.comment_count == COMMENTS_PER_NEWS for news in object_list
+    )
+
+
 @pytest.mark.parametrize(
     'url, user, has_access', ((DETAIL_URL,
                                pytest.lazy_fixture('author_client'), True),
@@ -38,6 +114,37 @@ def test_comment_form_availability_for_different_users(user, has_access, url):
         assert isinstance(context['form'], CommentForm)
 
 
+@pytest.mark.usefixtures('many_comments')
+def test_comments_are_paginated(client, news, settings):
+    settings.COMMENTS_COUNT_ON_DETAIL_PAGE = 2
+    context = client.get(reverse('news:detail', args=(news.pk,))).context
+    comments = [comment['pk'] for comment in context['comments']]
+    while context['next_comments_cursor']:
+        context = client.get(
+            reverse('news:comments', args=(news.pk,)),
+            {'cursor': context['next_comments_cursor']},
+        ).context
+        assert len(context['comments']) <= 2
+        comments += [comment['pk'] for comment in context['comments']]
+    assert comments == list(
+        news.comment_set.order_by('created', 'id').values_list(
+            'pk', flat=True
+        )
+    )
+
+
+@pytest.mark.usefixtures('many_comments')
+def test_cursor_variants_share_one_cache_entry(client, news, settings):
+    settings.COMMENTS_COUNT_ON_DETAIL_PAGE = 2
+    url = reverse('news:comments', args=(news.pk,))
+    cursor = client.get(url).context['next_comments_cursor']
+    expected = client.get(url, {'cursor': cursor}).context['comments']
+    # update() не шлёт сигналов: версия та же, старый HTML остаётся в кэше.
+    Comment.objects.update(text='Изменённый текст')
+    context = client.get(url, {'cursor': cursor + ' !!' * 100}).context
+    assert context['comments'] == expected
+
+
 @pytest.mark.parametrize(
     'url', [(DETAIL_URL)]
 )
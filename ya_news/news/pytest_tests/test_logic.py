@@ -1,10 +1,26 @@
+import io
+import sqlite3
+import json
+import threading
+import time
 from http import HTTPStatus
 
 import pytest
+from django.core.management import call_command
+from django.db import (
+    DatabaseError, OperationalError, connection, connections
+)
+from django.db.utils import load_backend
+from django.test import Client
+from django.urls import reverse
 from pytest_django.asserts import assertFormError, assertRedirects
 
+from news import group_commit
 from news.forms import WARNING
-from news.models import Comment
+from news.models import BadWord, Comment, News
+from yanews.routers import read_only
+from yanews.slowlog import SlowQueryRecorder
+from yanews.twotier import TwoTierCache, Uncacheable, check_shared_cache
 
 pytestmark = pytest.mark.django_db
 
@@ -33,6 +49,68 @@ def test_user_can_create_comment(
     assert comment.author == author
 
 
+def test_comment_count_follows_comments(
+        author, author_client, news, form_data, detail_url):
+    author_client.post(detail_url, data=form_data)
+    news.refresh_from_db()
+    assert news.comment_count == 1
+    comment = Comment.objects.get(news=news)
+    author_client.post(reverse('news:delete', args=(comment.pk,)))
+    news.refresh_from_db()
+    assert news.comment_count == 0
+
+
+@pytest.mark.django_db(transaction=True)
+def test_group_commit_creates_comment(
+        author, author_client, news, form_data, detail_url,
+        news_comment_redirect, settings):
+    settings.NEWS_COMMENT_GROUP_COMMIT = True
+    response = author_client.post(detail_url, data=form_data)
+    assertRedirects(response, news_comment_redirect)
+    comment = Comment.objects.get()
+    assert comment.text == form_data['text']
+    assert comment.author == author
+    news.refresh_from_db()
+    assert news.comment_count == 1
+
+
+def test_group_commit_survives_unexpected_error(monkeypatch):
+    writes = iter((RuntimeError('сбой'), None))
+
+    def write_comments(comments):
+        error = next(writes)
+        if error is not None:
+            raise error
+
+    monkeypatch.setattr(group_commit, 'write_comments', write_comments)
+    writer = group_commit.CommentWriter(batch_size=10)
+    with pytest.raises(RuntimeError):
+        writer.submit(Comment()).result(timeout=5)
+    assert writer.submit(Comment()).result(timeout=5) is None
+
+
+def test_comment_count_after_author_deletion(
+        author, author_client, news, form_data, detail_url):
+    author_client.post(detail_url, data=form_data)
+    author.delete()
+    news.refresh_from_db()
+    assert news.comment_count == 0
+
+
+def test_new_comment_refreshes_cached_page(
+        author_client, form_data, detail_url, settings,
+        django_capture_on_commit_callbacks):
+    settings.NEWS_PAGE_CACHE_ENABLED = True
+    client = Client()
+    etag = client.get(detail_url)['ETag']
+    form_data['text'] = 'Свежий комментарий'
+    with django_capture_on_commit_callbacks(execute=True):
+        author_client.post(detail_url, data=form_data)
+    response = client.get(detail_url, HTTP_IF_NONE_MATCH=etag)
+    assert response.status_code == HTTPStatus.OK
+    assert form_data['text'] in response.content.decode()
+
+
 def test_user_cant_use_bad_words(admin_client, bad_words_data, detail_url):
     all_initial_comments = set(Comment.objects.all())
     response = admin_client.post(detail_url, data=bad_words_data)
@@ -41,6 +119,28 @@ def test_user_cant_use_bad_words(admin_client, bad_words_data, detail_url):
     assert all_comments == all_initial_comments
 
 
+@pytest.mark.parametrize(
+    'text', ('Ты РЕДИИИСКА!', 'Ну и peдиcкa', 'Вот нeгoдяй')
+)
+def test_user_cant_disguise_bad_words(admin_client, detail_url, text):
+    response = admin_client.post(detail_url, data={'text': text})
+    assertFormError(response, form='form', field='text', errors=WARNING)
+    assert not Comment.objects.exists()
+
+
+def test_bad_words_from_database_are_applied(
+        admin_client, detail_url, django_capture_on_commit_callbacks):
+    admin_client.post(detail_url, data={'text': 'Какой-то проходимец'})
+    with django_capture_on_commit_callbacks(execute=True) as callbacks:
+        BadWord.objects.create(word='проходимец')
+    assert len(callbacks) == 1
+    response = admin_client.post(
+        detail_url, data={'text': 'Ещё один проходимец'}
+    )
+    assertFormError(response, form='form', field='text', errors=WARNING)
+    assert Comment.objects.count() == 1
+
+
 def test_author_can_edit_comment(
         author_client, comment, form_data, edit_url, news_comment_redirect):
     initial_comment_author = comment.author
@@ -60,6 +160,14 @@ def test_author_can_delete_comment(
     assert not Comment.objects.filter(pk=comment.pk).exists()
 
 
+def test_edited_comment_replaces_cached_one(
+        author_client, comment, form_data, edit_url, detail_url):
+    author_client.get(detail_url)
+    form_data['text'] = 'Новый текст'
+    author_client.post(edit_url, data=form_data)
+    assert form_data['text'] in author_client.get(detail_url).content.decode()
+
+
 def test_other_user_cant_edit_comment(
         admin_client, comment, form_data, edit_url):
     initial_comment_author = comment.author
@@ -87,3 +195,280 @@ def test_other_user_cant_delete_comment(
     assert comment.author == initial_comment_author
     assert comment.text == initial_comment_text
     assert initial_comments == comments
+
+
+def test_connection_pragmas_follow_settings(settings):
+    with connection.cursor() as cursor:
+        cursor.execute('PRAGMA busy_timeout')
+        assert cursor.fetchone()[0] == settings.SQLITE_BUSY_TIMEOUT
+
+
+def test_read_only_views_read_from_replica(monkeypatch):
+    assert News.objects.all().db == 'default'
+    with read_only():
+        assert News.objects.all().db == 'default'
+    monkeypatch.setitem(
+        connections['readonly'].settings_dict, 'NAME', 'file:other?mode=ro'
+    )
+    with read_only():
+        assert News.objects.all().db == 'readonly'
+    assert News.objects.all().db == 'default'
+
+
+def test_read_only_connection_reads_file_and_rejects_writes(tmp_path):
+    path = tmp_path / 'replica.sqlite3'
+    with sqlite3.connect(path) as source:
+        source.execute('CREATE TABLE item (name TEXT)')
+        source.execute("INSERT INTO item VALUES ('строка')")
+    source.close()
+    replica = load_backend('yanews.sqlite3').DatabaseWrapper({
+        **connections['readonly'].settings_dict,
+        'NAME': path.as_uri() + '?mode=ro',
+    }, alias='replica')
+    try:
+        with replica.cursor() as cursor:
+            cursor.execute('SELECT name FROM item')
+            assert cursor.fetchall() == [('строка',)]
+            cursor.execute('PRAGMA query_only')
+            assert cursor.fetchone()[0] == 1
+            with pytest.raises(OperationalError):
+                cursor.execute("INSERT INTO item VALUES ('запись')")
+    finally:
+        replica.close()
+
+
+def test_session_and_user_come_from_cache(
+        author, author_client, django_assert_num_queries):
+    author_client.get(reverse('news:home'))
+    # Остаётся только запрос списка новостей.
+    with django_assert_num_queries(1):
+        response = author_client.get(reverse('news:home'))
+    assert response.wsgi_request.user == author
+
+
+def test_logout_ends_cached_session(author_client):
+    author_client.get(reverse('news:home'))
+    session_cookie = author_client.cookies['sessionid'].value
+    author_client.get(reverse('users:logout'))
+    other_client = Client()
+    other_client.cookies['sessionid'] = session_cookie
+    response = other_client.get(reverse('news:home'))
+    assert not response.wsgi_request.user.is_authenticated
+
+
+def test_password_change_drops_cached_user(author, author_client):
+    author_client.get(reverse('news:home'))
+    author.set_password('новый-пароль')
+    author.save()
+    response = author_client.get(reverse('news:home'))
+    assert not response.wsgi_request.user.is_authenticated
+
+
+def test_missing_key_is_computed_once():
+    two_tier_cache = TwoTierCache('stampede')
+    calls = []
+    results = []
+
+    def compute():
+        calls.append(1)
+        time.sleep(0.1)
+        return 'страница'
+
+    def worker():
+        two_tier_cache.clear_local()
+        results.append(two_tier_cache.get_or_set('hot', compute, 60))
+
+    threads = [threading.Thread(target=worker) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert len(calls) == 1
+    assert results == ['страница'] * 8
+    assert two_tier_cache.flights == {}
+
+
+def test_slow_key_does_not_block_other_keys():
+    two_tier_cache = TwoTierCache('flights')
+    started = threading.Event()
+    release = threading.Event()
+
+    def slow():
+        started.set()
+        release.wait(5)
+        return 'медленно'
+
+    thread = threading.Thread(
+        target=two_tier_cache.get_or_set, args=('slow', slow, 60)
+    )
+    thread.start()
+    started.wait(5)
+    try:
+        for index in range(100):
+            assert two_tier_cache.get_or_set(
+                f'key{index}', lambda: index, 60
+            ) == index
+    finally:
+        release.set()
+        thread.join()
+
+
+def test_waiter_stops_when_owner_result_is_uncacheable(settings):
+    settings.TWO_TIER_CACHE_LOCK_TIMEOUT = 5
+    owner, waiter = TwoTierCache('private'), TwoTierCache('private')
+    started = threading.Event()
+
+    def private():
+        started.set()
+        time.sleep(0.1)
+        raise Uncacheable('чужое')
+
+    thread = threading.Thread(
+        target=owner.get_or_set, args=('page', private, 60)
+    )
+    thread.start()
+    started.wait(5)
+    begun = time.monotonic()
+    try:
+        assert waiter.get_or_set('page', lambda: 'своё', 60) == 'своё'
+    finally:
+        thread.join()
+    assert time.monotonic() - begun < 1
+    assert waiter.stats['wait'] == 1
+
+
+def test_entry_is_refreshed_early(settings):
+    settings.TWO_TIER_CACHE_EARLY_REFRESH_BETA = 10 ** 9
+    two_tier_cache = TwoTierCache('early')
+    values = iter(('старое', 'новое'))
+
+    def compute():
+        time.sleep(0.01)
+        return next(values)
+
+    assert two_tier_cache.get_or_set('hot', compute, 60) == 'старое'
+    assert two_tier_cache.get_or_set('hot', compute, 60) == 'новое'
+    assert two_tier_cache.stats['early_refresh'] == 1
+
+
+def test_authorized_request_is_profiled(
+        client, detail_url, many_comments, settings, tmp_path):
+    settings.PROFILER_TOKEN = 'secret'
+    settings.PROFILER_DIR = tmp_path
+    settings.PROFILER_INTERVAL = 0.0001
+    client.get(detail_url)
+    assert not tmp_path.exists() or not any(tmp_path.iterdir())
+    client.get(detail_url, HTTP_X_PROFILE='secret')
+    profiles = list((tmp_path / 'news.detail').glob('*.folded'))
+    assert len(profiles) == 1
+
+
+def test_merge_profiles_marks_template_and_orm(settings, tmp_path):
+    settings.PROFILER_DIR = tmp_path
+    (tmp_path / 'news.detail').mkdir()
+    (tmp_path / 'news.detail' / '1-1.folded').write_text(
+        'a:main;django.template.base:render;django.db.models:execute 3\n'
+        'a:main;django.db.models:execute 1\n'
+    )
+    (tmp_path / 'news.detail' / '2-1.folded').write_text(
+        'a:main;django.db.models:execute 1\n'
+    )
+    output = tmp_path / 'merged.folded'
+    call_command('merge_profiles', output=output, stderr=io.StringIO())
+    assert output.read_text().splitlines() == [
+        'a:main;[ORM];django.db.models:execute 2',
+        'a:main;[template];django.template.base:render;'
+        'django.db.models:execute 3',
+    ]
+
+
+def test_slow_queries_are_logged_with_plan(
+        client, detail_url, settings, tmp_path):
+    settings.SLOW_QUERY_THRESHOLD = 0
+    settings.SLOW_QUERY_LOG = tmp_path / 'slow.jsonl'
+    client.get(detail_url)
+    records = [
+        json.loads(line)
+        for line in settings.SLOW_QUERY_LOG.read_text().splitlines()
+    ]
+    comments_query = next(
+        record for record in records if 'FROM "news_comment"' in record['sql']
+    )
+    assert comments_query['url_name'] == 'news:detail'
+    assert any(
+        'comment_news_created_idx' in detail
+        for detail in comments_query['plan']
+    )
+
+
+def test_analyzer_suggests_composite_index(settings, tmp_path):
+    settings.SLOW_QUERY_LOG = tmp_path / 'slow.jsonl'
+    record = {
+        'time': 0,
+        'url_name': 'news:detail',
+        'sql': 'SELECT "news_comment"."id" FROM "news_comment" '
+               'WHERE "news_comment"."text" = %s '
+               'ORDER BY "news_comment"."created" ASC',
+        'duration_ms': 120,
+        'plan': ['SCAN news_comment', 'USE TEMP B-TREE FOR ORDER BY'],
+    }
+    settings.SLOW_QUERY_LOG.write_text(
+        (json.dumps(record) + '\n') * 2
+    )
+    output = io.StringIO()
+    call_command('analyze_slow_queries', stdout=output)
+    report = output.getvalue()
+    assert '[2 раз, всего 240.0 мс' in report
+    assert 'полный просмотр news_comment' in report
+    assert "models.Index(fields=('text', 'created')) в news.Comment" in (
+        report
+    )
+
+
+def test_admin_inline_comments_update_counter(admin_client, news, comment):
+    News.objects.filter(pk=news.pk).update(comment_count=1)
+    prefix = 'comment_set'
+    response = admin_client.post(
+        reverse('admin:news_news_change', args=(news.pk,)),
+        data={
+            'title': news.title,
+            'text': news.text,
+            'date': news.date.strftime('%d.%m.%Y'),
+            f'{prefix}-TOTAL_FORMS': 2,
+            f'{prefix}-INITIAL_FORMS': 1,
+            f'{prefix}-0-id': comment.pk,
+            f'{prefix}-0-news': news.pk,
+            f'{prefix}-0-author': comment.author_id,
+            f'{prefix}-0-text': comment.text,
+            f'{prefix}-0-DELETE': 'on',
+            f'{prefix}-1-news': news.pk,
+            f'{prefix}-1-author': comment.author_id,
+            f'{prefix}-1-text': 'Из админки',
+        },
+    )
+    assert response.status_code == HTTPStatus.FOUND
+    news.refresh_from_db()
+    assert news.comment_count == 1
+    assert Comment.objects.get(news=news).text == 'Из админки'
+
+
+def test_failed_query_is_not_logged():
+    recorder = SlowQueryRecorder(threshold=0)
+
+    def execute(sql, params, many, context):
+        raise DatabaseError
+
+    with pytest.raises(DatabaseError):
+        recorder(execute, 'SELECT 1', (), False, {'connection': connection})
+    assert recorder.records == []
+
+
+def test_process_local_cache_is_reported(settings):
+    settings.DEBUG = False
+    assert [message.id for message in check_shared_cache(None)] == [
+        'yanews.W001'
+    ]
+    settings.CACHES = {'default': {
+        'BACKEND': 'django.core.cache.backends.memcached.PyMemcacheCache',
+    }}
+    assert check_shared_cache(None) == []
@@ -1,3 +1,4 @@
+from django.test import Client
 from django.urls import reverse
 from http import HTTPStatus
 
@@ -10,7 +11,9 @@ pytestmark = pytest.mark.django_db
 LOGOUT_URL = reverse('users:logout')
 SIGNUP_URL = reverse('users:signup')
 HOME_URL = reverse('news:home')
+ARCHIVE_URL = reverse('news:archive')
 DETAIL_URL = lazy_fixture('detail_url')
+COMMENTS_URL = lazy_fixture('comments_url')
 DELETE_URL = pytest.lazy_fixture('delete_url')
 EDIT_URL = pytest.lazy_fixture('edit_url')
 LOGIN_URL = reverse('users:login')
@@ -25,6 +28,9 @@ DELETE_REDIRECT_URL = f'{LOGIN_URL}?next={[(DELETE_URL)]}'
     (
         (HOME_URL, ADMIN_CLIENT, HTTPStatus.OK),
         (HOME_URL, AUTHOR_CLIENT, HTTPStatus.OK),
+        (ARCHIVE_URL, ADMIN_CLIENT, HTTPStatus.OK),
+        (ARCHIVE_URL, AUTHOR_CLIENT, HTTPStatus.OK),
+        (f'{ARCHIVE_URL}?cursor=broken', AUTHOR_CLIENT, HTTPStatus.NOT_FOUND),
         (LOGIN_URL, ADMIN_CLIENT, HTTPStatus.OK),
         (LOGIN_URL, AUTHOR_CLIENT, HTTPStatus.OK),
         (LOGOUT_URL, ADMIN_CLIENT, HTTPStatus.OK),
@@ -33,6 +39,8 @@ DELETE_REDIRECT_URL = f'{LOGIN_URL}?next={[(DELETE_URL)]}'
         (SIGNUP_URL, AUTHOR_CLIENT, HTTPStatus.OK),
         (DETAIL_URL, ADMIN_CLIENT, HTTPStatus.OK),
         (DETAIL_URL, AUTHOR_CLIENT, HTTPStatus.OK),
+        (COMMENTS_URL, ADMIN_CLIENT, HTTPStatus.OK),
+        (COMMENTS_URL, AUTHOR_CLIENT, HTTPStatus.OK),
         (DELETE_URL, ADMIN_CLIENT, HTTPStatus.NOT_FOUND),
         (DELETE_URL, AUTHOR_CLIENT, HTTPStatus.OK),
         (EDIT_URL, ADMIN_CLIENT, HTTPStatus.NOT_FOUND),
@@ -57,3 +65,38 @@ def test_overall_avaliability(
 )
 def test_redirects_for_anonymous_client(client, url, redirect_url):
     assertRedirects(client.get(url), redirect_url)
+
+
+@pytest.mark.parametrize('url', (HOME_URL, DETAIL_URL))
+def test_anonymous_pages_answer_not_modified(client, settings, url):
+    settings.NEWS_PAGE_CACHE_ENABLED = True
+    response = client.get(url)
+    assert response.status_code == HTTPStatus.OK
+    response = client.get(url, HTTP_IF_NONE_MATCH=response['ETag'])
+    assert response.status_code == HTTPStatus.NOT_MODIFIED
+
+
+def test_comment_edit_changes_last_modified(
+        author_client, detail_url, edit_url, settings):
+    settings.NEWS_PAGE_CACHE_ENABLED = True
+    anonymous_client = Client()
+    last_modified = anonymous_client.get(detail_url)['Last-Modified']
+    author_client.post(edit_url, data={'text': 'Исправленный текст'})
+    response = anonymous_client.get(
+        detail_url, HTTP_IF_MODIFIED_SINCE=last_modified
+    )
+    assert response.status_code == HTTPStatus.OK
+    assert 'Исправленный текст' in response.content.decode()
+
+
+def test_metrics_count_view_queries(client, settings):
+    settings.METRICS_ENABLED = True
+    client.get(HOME_URL)
+    response = client.get(reverse('metrics'))
+    assert response.status_code == HTTPStatus.OK
+    assert 'view_db_queries_count{view="news:home"} ' in (
+        response.content.decode()
+    )
+    assert 'two_tier_cache_events_total{cache="pages",event="miss"} ' in (
+        response.content.decode()
+    )
@@ -0,0 +1,65 @@
+from functools import partial
+
+from django.conf import settings
+from django.contrib.auth.signals import user_logged_out
+from django.db import transaction
+from django.db.models import Count, F
+from django.db.models.functions import Greatest
+from django.db.models.signals import post_delete, post_save, pre_delete
+from django.dispatch import receiver
+
+from .auth import invalidate_user
+from .cache import bump_comments_version, bump_content_version, bump_version
+from .models import BadWord, Comment, News
+from .profanity import BAD_WORDS_VERSION_KEY
+
+
+@receiver(pre_delete, sender=settings.AUTH_USER_MODEL)
+def discount_author_comments(sender, instance, **kwargs):
+    """
+    Комментарии удаляемого пользователя уходят каскадом.
+
+    Счётчики уменьшаем одним запросом на каждую затронутую новость,
+    в той же транзакции, что и само удаление.
+    """
+    per_news = Comment.objects.filter(author=instance).order_by().values(
+        'news'
+    ).annotate(count=Count('pk'))
+    for row in per_news:
+        News.objects.filter(pk=row['news']).update(
+            comment_count=Greatest(F('comment_count') - row['count'], 0)
+        )
+        transaction.on_commit(partial(bump_comments_version, row['news']))
+
+
+@receiver(post_save, sender=settings.AUTH_USER_MODEL)
+@receiver(post_delete, sender=settings.AUTH_USER_MODEL)
+def forget_cached_user(sender, instance, **kwargs):
+    """Правка пользователя, в том числе смена пароля, сбрасывает слепок."""
+    invalidate_user(instance.pk)
+
+
+@receiver(user_logged_out)
+def forget_logged_out_user(sender, request, user, **kwargs):
+    if user is not None:
+        invalidate_user(user.pk)
+
+
+@receiver(post_save, sender=News)
+@receiver(post_delete, sender=News)
+def invalidate_pages(sender, **kwargs):
+    """Изменение новости делает устаревшими закэшированные страницы."""
+    transaction.on_commit(bump_content_version)
+
+
+@receiver(post_save, sender=BadWord)
+@receiver(post_delete, sender=BadWord)
+def reload_bad_words(sender, **kwargs):
+    """
+    Автомат пересоберётся при следующей проверке текста.
+
+    Версия меняется после фиксации, чтобы пересборка не прочитала
+    незафиксированный список. Версия живёт в кэше по умолчанию:
+    с общим кэшем пересоберут все процессы, с LocMem — только этот.
+    """
+    transaction.on_commit(partial(bump_version, BAD_WORDS_VERSION_KEY))
@@ -1,12 +1,25 @@
+from django.conf import settings
 from django.urls import path
 
 from news import views
 
 app_name = 'news'
 
+news_list = views.NewsList.as_view()
+news_detail = views.NewsDetailView.as_view()
+if settings.NEWS_ASYNC_VIEWS:
+    news_list = views.async_read_view(news_list)
+    news_detail = views.async_read_view(news_detail)
+
 urlpatterns = [
-    path('', views.NewsList.as_view(), name='home'),
-    path('news/<int:pk>/', views.NewsDetailView.as_view(), name='detail'),
+    path('', news_list, name='home'),
+    path('archive/', views.NewsArchive.as_view(), name='archive'),
+    path('news/<int:pk>/', news_detail, name='detail'),
+    path(
+        'news/<int:pk>/comments/',
+        views.NewsComments.as_view(),
+        name='comments'
+    ),
     path(
         'delete_comment/<int:pk>/',
         views.CommentDelete.as_view(),
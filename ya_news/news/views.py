@@ -1,14 +1,54 @@
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial, wraps
+
+from asgiref.sync import sync_to_async
 from django.conf import settings
 from django.contrib.auth.mixins import LoginRequiredMixin
+from django.db import close_old_connections, transaction
+from django.db.models import F
+from django.db.models.functions import Greatest
+from django.http import Http404
 from django.shortcuts import get_object_or_404
 from django.urls import reverse
 from django.views import generic
 
+from yanews.metrics import request_execute_wrappers
+from yanews.routers import ReadOnlyViewMixin
+
+from .cache import (
+    bump_comments_version, find_cached_page, get_cached_page,
+    get_comment_page
+)
 from .forms import CommentForm
+from .group_commit import comment_writer
 from .models import Comment, News
+from .pagination import InvalidCursor, KeysetPaginator
+
+
+class AnonymousPageCacheMixin:
+    """
+    Кэш целых страниц для анонимных пользователей.
+
+    Включается настройкой NEWS_PAGE_CACHE_ENABLED.
+    """
+
+    def dispatch(self, request, *args, **kwargs):
+        if not (
+            settings.NEWS_PAGE_CACHE_ENABLED
+            and request.method in ('GET', 'HEAD')
+            and not request.user.is_authenticated
+        ):
+            return super().dispatch(request, *args, **kwargs)
+        return get_cached_page(
+            request, partial(super().dispatch, request, *args, **kwargs)
+        )
 
 
-class NewsList(generic.ListView):
+class NewsList(
+        ReadOnlyViewMixin, AnonymousPageCacheMixin, generic.ListView
+):
     """Список новостей."""
     model = News
     template_name = 'news/home.html'
@@ -18,32 +58,102 @@ class NewsList(generic.ListView):
         Выводим только несколько последних новостей.
 
         Их количество определяется в настройках проекта.
+        Количество комментариев хранится в самой новости,
+        сами комментарии не загружаются.
         """
-        return self.model.objects.prefetch_related(
-            'comment_set'
-        )[:settings.NEWS_COUNT_ON_HOME_PAGE]
+        return self.model.objects.all()[:settings.NEWS_COUNT_ON_HOME_PAGE]
+
 
+class NewsArchive(generic.ListView):
+    """
+    Архив всех новостей.
 
-class NewsDetail(generic.DetailView):
+    Страницы выбираются по курсору на (date, id), поэтому
+    дальние страницы не требуют OFFSET.
+    """
     model = News
-    template_name = 'news/detail.html'
+    template_name = 'news/archive.html'
+    ordering = ('-date', '-id')
+
+    def get_queryset(self):
+        paginator = KeysetPaginator(
+            self.model.objects.all(),
+            self.ordering,
+            settings.NEWS_COUNT_ON_ARCHIVE_PAGE,
+        )
+        try:
+            self.page = paginator.get_page(self.request.GET.get('cursor'))
+        except InvalidCursor:
+            raise Http404('Некорректный курсор страницы.')
+        return self.page.object_list
 
-    def get_object(self, queryset=None):
-        obj = get_object_or_404(
-            self.model.objects.prefetch_related('comment_set__author'),
-            pk=self.kwargs['pk']
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        context['next_cursor'] = self.page.next_cursor
+        return context
+
+
+class CommentPageMixin:
+    """
+    Одна страница комментариев к новости.
+
+    Страницы выбираются по курсору на (created, id), так что объём
+    работы на запрос не зависит от общего числа комментариев.
+    """
+    comment_ordering = ('created', 'id')
+
+    def get_comment_context(self, news):
+        """Готовый HTML комментариев берётся из кэша фрагментов."""
+        cursor = self.request.GET.get('cursor', '')
+        paginator = KeysetPaginator(
+            news.comment_set.select_related('author'),
+            self.comment_ordering,
+            settings.COMMENTS_COUNT_ON_DETAIL_PAGE,
         )
-        return obj
+        try:
+            if cursor:
+                cursor = paginator.normalize_cursor(cursor)
+        except InvalidCursor:
+            raise Http404('Некорректный курсор страницы.')
+        comments, next_cursor = get_comment_page(
+            news.pk, cursor, partial(paginator.get_page, cursor)
+        )
+        return {
+            'news': news,
+            'comments': comments,
+            'next_comments_cursor': next_cursor,
+        }
+
+
+class NewsDetail(
+        ReadOnlyViewMixin, AnonymousPageCacheMixin, CommentPageMixin,
+        generic.DetailView
+):
+    model = News
+    template_name = 'news/detail.html'
 
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
+        context.update(self.get_comment_context(self.object))
         if self.request.user.is_authenticated:
             context['form'] = CommentForm()
         return context
 
 
+class NewsComments(CommentPageMixin, generic.TemplateView):
+    """Следующая страница комментариев в виде HTML-фрагмента."""
+    template_name = 'includes/comments.html'
+
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        news = get_object_or_404(News.objects.only('id'), pk=kwargs['pk'])
+        context.update(self.get_comment_context(news))
+        return context
+
+
 class NewsComment(
         LoginRequiredMixin,
+        CommentPageMixin,
         generic.detail.SingleObjectMixin,
         generic.FormView
 ):
@@ -55,27 +165,45 @@ class NewsComment(
         self.object = self.get_object()
         return super().post(request, *args, **kwargs)
 
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        context.update(self.get_comment_context(self.object))
+        return context
+
     def form_valid(self, form):
         comment = form.save(commit=False)
         comment.news = self.object
         comment.author = self.request.user
-        comment.save()
+        if settings.NEWS_COMMENT_GROUP_COMMIT:
+            comment_writer.submit(comment).result(
+                timeout=settings.NEWS_COMMENT_WRITE_TIMEOUT
+            )
+            return super().form_valid(form)
+        with transaction.atomic():
+            comment.save()
+            News.objects.filter(pk=self.object.pk).update(
+                comment_count=F('comment_count') + 1
+            )
+            transaction.on_commit(
+                partial(bump_comments_version, self.object.pk)
+            )
         return super().form_valid(form)
 
     def get_success_url(self):
-        post = self.get_object()
-        return reverse('news:detail', kwargs={'pk': post.pk}) + '#comments'
+        return reverse(
+            'news:detail', kwargs={'pk': self.object.pk}
+        ) + '#comments'
 
 
 class NewsDetailView(generic.View):
+    detail_view = staticmethod(NewsDetail.as_view())
+    comment_view = staticmethod(NewsComment.as_view())
 
     def get(self, request, *args, **kwargs):
-        view = NewsDetail.as_view()
-        return view(request, *args, **kwargs)
+        return self.detail_view(request, *args, **kwargs)
 
     def post(self, request, *args, **kwargs):
-        view = NewsComment.as_view()
-        return view(request, *args, **kwargs)
+        return self.comment_view(request, *args, **kwargs)
 
 
 class CommentBase(LoginRequiredMixin):
@@ -83,9 +211,8 @@ class CommentBase(LoginRequiredMixin):
     model = Comment
 
     def get_success_url(self):
-        comment = self.get_object()
         return reverse(
-            'news:detail', kwargs={'pk': comment.news.pk}
+            'news:detail', kwargs={'pk': self.object.news_id}
         ) + '#comments'
 
     def get_queryset(self):
@@ -98,7 +225,80 @@ class CommentUpdate(CommentBase, generic.UpdateView):
     template_name = 'news/edit.html'
     form_class = CommentForm
 
+    def form_valid(self, form):
+        response = super().form_valid(form)
+        bump_comments_version(self.object.news_id)
+        return response
+
 
 class CommentDelete(CommentBase, generic.DeleteView):
     """Удаление комментария."""
     template_name = 'news/delete.html'
+
+    def delete(self, request, *args, **kwargs):
+        with transaction.atomic():
+            response = super().delete(request, *args, **kwargs)
+            News.objects.filter(pk=self.object.news_id).update(
+                comment_count=Greatest(F('comment_count') - 1, 0)
+            )
+            transaction.on_commit(
+                partial(bump_comments_version, self.object.news_id)
+            )
+        return response
+
+
+_db_executor = None
+_db_executor_lock = threading.Lock()
+
+
+def get_db_executor():
+    """Пул потоков для запросов к базе; создаётся при первом обращении."""
+    global _db_executor
+    with _db_executor_lock:
+        if _db_executor is None:
+            _db_executor = ThreadPoolExecutor(
+                max_workers=settings.NEWS_ASYNC_DB_WORKERS,
+                thread_name_prefix='news-db',
+            )
+    return _db_executor
+
+
+def render_in_thread(view, request, *args, **kwargs):
+    """
+    Синхронное представление вместе с отрисовкой шаблона.
+
+    Обёртки метрик и журнала запросов ставятся заново: соединения
+    этого потока middleware не видела.
+    """
+    try:
+        with request_execute_wrappers(request):
+            response = view(request, *args, **kwargs)
+            if hasattr(response, 'render'):
+                response.render()
+        return response
+    finally:
+        close_old_connections()
+
+
+def async_read_view(view):
+    """
+    Асинхронная обёртка для представлений только для чтения под ASGI.
+
+    Попадание в кэш страниц отдаётся прямо из цикла событий. Всё, что
+    требует базы, выполняется в пуле из NEWS_ASYNC_DB_WORKERS потоков,
+    поэтому число одновременных обращений к базе ограничено. Остальные
+    методы, например POST с комментарием, идут обычным синхронным
+    путём Django.
+    """
+    @wraps(view)
+    async def async_view(request, *args, **kwargs):
+        if request.method not in ('GET', 'HEAD'):
+            return await sync_to_async(view)(request, *args, **kwargs)
+        response = find_cached_page(request)
+        if response is not None:
+            return response
+        return await asyncio.get_running_loop().run_in_executor(
+            get_db_executor(),
+            partial(render_in_thread, view, request, *args, **kwargs),
+        )
+    return async_view
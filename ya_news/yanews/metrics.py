@@ -0,0 +1,165 @@
+"""
+Метрики запросов к базе по представлениям.
+
+Middleware считает число SQL-запросов, время в базе и общее время
+ответа для каждого имени URL и копит их в гистограммах процесса.
+Эндпоинт отдаёт гистограммы и счётчики двухуровневых кэшей
+в текстовом формате Prometheus.
+Всё включается настройкой METRICS_ENABLED; когда она выключена,
+middleware снимает себя из цепочки и не стоит ничего.
+
+Обёртки запросов ставятся на соединения потока запроса и запоминаются
+в request.db_execute_wrappers; код, выполняющий представление в другом
+потоке, ставит их там через request_execute_wrappers. Фоновая групповая
+запись комментариев обслуживает сразу много запросов, и её SQL
+в метрики отдельных представлений не попадает.
+"""
+import bisect
+import threading
+import time
+from contextlib import ExitStack, contextmanager
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+from django.http import Http404, HttpResponse
+
+from .twotier import render_metrics
+
+QUERY_BUCKETS = (1, 2, 5, 10, 20, 50, 100, float('inf'))
+SECONDS_BUCKETS = (
+    0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, float('inf')
+)
+
+
+class Histogram:
+    """Гистограмма с накопительными корзинами, как в Prometheus."""
+
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.sum = 0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def render(self, name, labels):
+        lines = []
+        total = 0
+        for bound, count in zip(self.buckets, self.counts):
+            total += count
+            le = '+Inf' if bound == float('inf') else bound
+            lines.append(f'{name}_bucket{{{labels},le="{le}"}} {total}')
+        lines.append(f'{name}_sum{{{labels}}} {self.sum}')
+        lines.append(f'{name}_count{{{labels}}} {self.count}')
+        return lines
+
+
+class ViewMetrics:
+    """Гистограммы по каждому имени URL."""
+    series = (
+        ('view_db_queries', 'SQL-запросов на ответ', QUERY_BUCKETS),
+        ('view_db_seconds', 'Время в базе на ответ', SECONDS_BUCKETS),
+        ('view_seconds', 'Время ответа', SECONDS_BUCKETS),
+    )
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.views = {}
+
+    def observe(self, view_name, *values):
+        with self.lock:
+            histograms = self.views.setdefault(view_name, [
+                Histogram(buckets) for _, _, buckets in self.series
+            ])
+            for histogram, value in zip(histograms, values):
+                histogram.observe(value)
+
+    def render(self):
+        lines = []
+        with self.lock:
+            for index, (name, help_text, _) in enumerate(self.series):
+                lines.append(f'# HELP {name} {help_text}')
+                lines.append(f'# TYPE {name} histogram')
+                for view_name, histograms in sorted(self.views.items()):
+                    lines += histograms[index].render(
+                        name, f'view="{view_name}"'
+                    )
+        return '\n'.join(lines) + '\n'
+
+
+METRICS = ViewMetrics()
+
+
+class QueryCounter:
+    """Обёртка для execute_wrapper: считает запросы и время в базе."""
+
+    def __init__(self):
+        self.count = 0
+        self.duration = 0
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.duration += time.perf_counter() - started
+            self.count += 1
+
+
+@contextmanager
+def execute_wrappers(wrappers):
+    """Ставит обёртки на все соединения текущего потока."""
+    with ExitStack() as stack:
+        for connection in connections.all():
+            for wrapper in wrappers:
+                stack.enter_context(connection.execute_wrapper(wrapper))
+        yield
+
+
+def add_execute_wrapper(request, wrapper):
+    """Запоминает обёртку в запросе и ставит её в текущем потоке."""
+    request.db_execute_wrappers = [
+        *getattr(request, 'db_execute_wrappers', ()), wrapper
+    ]
+    return execute_wrappers([wrapper])
+
+
+def request_execute_wrappers(request):
+    """Обёртки запроса для потока, в котором выполняется представление."""
+    return execute_wrappers(getattr(request, 'db_execute_wrappers', ()))
+
+
+class QueryMetricsMiddleware:
+
+    def __init__(self, get_response):
+        if not settings.METRICS_ENABLED:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+
+    def __call__(self, request):
+        counter = QueryCounter()
+        started = time.perf_counter()
+        with add_execute_wrapper(request, counter):
+            response = self.get_response(request)
+        if request.resolver_match is not None:
+            METRICS.observe(
+                request.resolver_match.view_name,
+                counter.count,
+                counter.duration,
+                time.perf_counter() - started,
+            )
+        return response
+
+
+def metrics_view(request):
+    """Метрики в текстовом формате Prometheus."""
+    if not settings.METRICS_ENABLED:
+        raise Http404
+    return HttpResponse(
+        METRICS.render() + render_metrics(),
+        content_type='text/plain; version=0.0.4',
+    )
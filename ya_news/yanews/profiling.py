@@ -0,0 +1,150 @@
+"""
+Выборочное профилирование запросов.
+
+Middleware профилирует долю запросов PROFILER_SAMPLE_RATE и любой
+запрос с заголовком PROFILER_HEADER, равным PROFILER_TOKEN. Пока
+запрос выполняется, отдельный поток раз в PROFILER_INTERVAL секунд
+снимает стек потока запроса через sys._current_frames, так что сам
+код запроса не замедляется трассировкой. Стеки пишутся в формате
+folded («кадр;кадр;кадр число») в каталог PROFILER_DIR/<имя URL>,
+где хранятся не больше PROFILER_MAX_FILES последних файлов.
+Команда merge_profiles сводит их в один файл для flame graph.
+"""
+import hmac
+import os
+import random
+import sys
+import threading
+import time
+from collections import Counter
+from pathlib import Path
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+
+CATEGORIES = (
+    ('django.template', '[template]'),
+    ('django.db', '[ORM]'),
+)
+
+
+def frame_label(frame):
+    module = frame.f_globals.get('__name__', '?')
+    return f'{module}:{frame.f_code.co_name}'
+
+
+def fold(frame):
+    """Стек от корня к текущему кадру одной строкой."""
+    labels = []
+    while frame is not None:
+        labels.append(frame_label(frame))
+        frame = frame.f_back
+    return ';'.join(reversed(labels))
+
+
+class Sampler(threading.Thread):
+    """Снимает стеки одного потока, пока не вызван stop()."""
+
+    def __init__(self, thread_id, interval):
+        super().__init__(daemon=True)
+        self.thread_id = thread_id
+        self.interval = interval
+        self.stacks = Counter()
+        self.stopped = threading.Event()
+
+    def sample(self):
+        frame = sys._current_frames().get(self.thread_id)
+        if frame is not None:
+            self.stacks[fold(frame)] += 1
+
+    def run(self):
+        while not self.stopped.wait(self.interval):
+            self.sample()
+
+    def stop(self):
+        """
+        Останавливает поток и снимает последний стек.
+
+        Быстрый запрос может закончиться раньше первого интервала;
+        последний снимок гарантирует непустой профиль.
+        """
+        self.stopped.set()
+        self.join()
+        self.sample()
+
+
+def profile_dir(url_name):
+    return Path(settings.PROFILER_DIR) / url_name.replace(':', '.')
+
+
+def write_profile(url_name, stacks):
+    """Пишет профиль запроса и удаляет самые старые файлы сверх лимита."""
+    directory = profile_dir(url_name)
+    directory.mkdir(parents=True, exist_ok=True)
+    path = directory / f'{time.time_ns()}-{os.getpid()}.folded'
+    path.write_text(
+        ''.join(f'{stack} {count}\n' for stack, count in stacks.items())
+    )
+    files = sorted(directory.glob('*.folded'))
+    for old in files[:-settings.PROFILER_MAX_FILES]:
+        old.unlink(missing_ok=True)
+
+
+def read_profiles(url_name=None):
+    """Сумма стеков всех профилей или профилей одного имени URL."""
+    root = Path(settings.PROFILER_DIR)
+    pattern = f'{url_name.replace(":", ".")}/*.folded' if url_name else (
+        '*/*.folded'
+    )
+    stacks = Counter()
+    for path in root.glob(pattern):
+        for line in path.read_text().splitlines():
+            stack, _, count = line.rpartition(' ')
+            if stack:
+                stacks[stack] += int(count)
+    return stacks
+
+
+def categorize(stack):
+    """
+    Вставляет перед первым кадром шаблонов или ORM кадр-метку.
+
+    Возвращает стек и категорию; метка наружного слоя побеждает, так
+    что запросы из шаблона попадают в [template].
+    """
+    frames = stack.split(';')
+    for index, frame in enumerate(frames):
+        for prefix, label in CATEGORIES:
+            if frame.startswith(prefix):
+                frames.insert(index, label)
+                return ';'.join(frames), label
+    return stack, None
+
+
+class SamplingProfilerMiddleware:
+
+    def __init__(self, get_response):
+        if not (settings.PROFILER_SAMPLE_RATE or settings.PROFILER_TOKEN):
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+
+    def should_profile(self, request):
+        token = request.headers.get(settings.PROFILER_HEADER)
+        if token and settings.PROFILER_TOKEN:
+            return hmac.compare_digest(
+                token.encode(), settings.PROFILER_TOKEN.encode()
+            )
+        return random.random() < settings.PROFILER_SAMPLE_RATE
+
+    def __call__(self, request):
+        if not self.should_profile(request):
+            return self.get_response(request)
+        sampler = Sampler(threading.get_ident(), settings.PROFILER_INTERVAL)
+        sampler.start()
+        try:
+            response = self.get_response(request)
+        finally:
+            sampler.stop()
+        if request.resolver_match is not None:
+            write_profile(request.resolver_match.view_name, sampler.stacks)
+        return response
@@ -0,0 +1,73 @@
+"""
+Чтение из отдельных соединений только для чтения.
+
+Представления с ReadOnlyViewMixin выполняются внутри read_only(), и
+роутер отправляет их запросы на чтение в соединение READ_ONLY_DATABASE,
+открытое с mode=ro. Все записи и остальные чтения идут в default.
+Соединения Django живут по одному на поток, так что при CONN_MAX_AGE
+потоки сервера держат собственный пул читающих соединений.
+
+В тестах READ_ONLY_DATABASE — зеркало default с тем же именем базы,
+и роутер читает из default: иначе отдельное соединение не видело бы
+данных из незафиксированной транзакции теста.
+"""
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections
+
+reading = ContextVar('reading', default=False)
+
+
+@contextmanager
+def read_only():
+    token = reading.set(True)
+    try:
+        yield
+    finally:
+        reading.reset(token)
+
+
+def read_only_alias():
+    """Псевдоним соединения для чтения, если это отдельная база."""
+    alias = settings.READ_ONLY_DATABASE
+    if alias not in settings.DATABASES:
+        return None
+    if (
+        connections[alias].settings_dict['NAME']
+        == connections[DEFAULT_DB_ALIAS].settings_dict['NAME']
+    ):
+        return None
+    return alias
+
+
+class ReadOnlyRouter:
+
+    def db_for_read(self, model, **hints):
+        if reading.get():
+            return read_only_alias()
+        return None
+
+    def db_for_write(self, model, **hints):
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        return True
+
+    def allow_migrate(self, db, app_label, **hints):
+        return db == DEFAULT_DB_ALIAS
+
+
+class ReadOnlyViewMixin:
+    """
+    Представление целиком, вместе с отрисовкой шаблона, читает
+    из соединения только для чтения.
+    """
+
+    def dispatch(self, request, *args, **kwargs):
+        with read_only():
+            response = super().dispatch(request, *args, **kwargs)
+            if hasattr(response, 'render'):
+                response.render()
+        return response
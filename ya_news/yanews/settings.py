@@ -22,6 +22,9 @@ INSTALLED_APPS = [
 
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
+    'yanews.metrics.QueryMetricsMiddleware',
+    'yanews.profiling.SamplingProfilerMiddleware',
+    'yanews.slowlog.SlowQueryLogMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
@@ -53,10 +56,42 @@ WSGI_APPLICATION = 'yanews.wsgi.application'
 
 DATABASES = {
     'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
+        'ENGINE': 'yanews.sqlite3',
         'NAME': BASE_DIR / 'db.sqlite3',
-    }
+    },
+    'readonly': {
+        'ENGINE': 'yanews.sqlite3',
+        'NAME': (BASE_DIR / 'db.sqlite3').as_uri() + '?mode=ro',
+        'OPTIONS': {'uri': True},
+        'CONN_MAX_AGE': 60,
+        'TEST': {'MIRROR': 'default'},
+    },
 }
+DATABASE_ROUTERS = ['yanews.routers.ReadOnlyRouter']
+READ_ONLY_DATABASE = 'readonly'
+
+SQLITE_JOURNAL_MODE = 'wal'
+SQLITE_SYNCHRONOUS = 'normal'
+SQLITE_BUSY_TIMEOUT = 5000
+SQLITE_MMAP_SIZE = 64 * 1024 * 1024
+
+
+# Межпроцессные гарантии двухуровневого кэша, автосохранения и версий
+# страниц требуют общего кэша (Memcached, Redis); LocMem годится только
+# для одного процесса, и проверка yanews.W001 напоминает об этом.
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+}
+
+SESSION_ENGINE = 'news.sessions'
+AUTHENTICATION_BACKENDS = ['news.auth.CachedModelBackend']
+AUTH_USER_CACHE_TIMEOUT = 60 * 5
+TWO_TIER_CACHE_SIZE = 1000
+TWO_TIER_CACHE_LOCAL_TIMEOUT = 5
+TWO_TIER_CACHE_LOCK_TIMEOUT = 10
+TWO_TIER_CACHE_EARLY_REFRESH_BETA = 1.0
 
 
 AUTH_PASSWORD_VALIDATORS = []
@@ -80,3 +115,25 @@ LOGIN_URL = reverse_lazy('users:login')
 LOGIN_REDIRECT_URL = reverse_lazy('news:home')
 
 NEWS_COUNT_ON_HOME_PAGE = 10
+NEWS_COUNT_ON_ARCHIVE_PAGE = 20
+COMMENTS_COUNT_ON_DETAIL_PAGE = 50
+COMMENTS_CACHE_TIMEOUT = 60 * 60
+NEWS_PAGE_CACHE_ENABLED = False
+NEWS_PAGE_CACHE_TIMEOUT = 60
+NEWS_ASYNC_VIEWS = False
+NEWS_ASYNC_DB_WORKERS = 8
+NEWS_COMMENT_GROUP_COMMIT = False
+NEWS_COMMENT_BATCH_SIZE = 100
+NEWS_COMMENT_WRITE_TIMEOUT = 10
+
+METRICS_ENABLED = False
+
+PROFILER_SAMPLE_RATE = 0
+PROFILER_HEADER = 'X-Profile'
+PROFILER_TOKEN = ''
+PROFILER_INTERVAL = 0.005
+PROFILER_DIR = BASE_DIR / 'profiles'
+PROFILER_MAX_FILES = 200
+
+SLOW_QUERY_THRESHOLD = None
+SLOW_QUERY_LOG = BASE_DIR / 'slow_queries.jsonl'
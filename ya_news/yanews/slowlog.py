@@ -0,0 +1,176 @@
+"""
+Журнал медленных запросов.
+
+Middleware замеряет каждый SQL-запрос; запросы дольше
+SLOW_QUERY_THRESHOLD секунд записываются в файл SLOW_QUERY_LOG
+в формате JSON Lines вместе с планом EXPLAIN QUERY PLAN, снятым сразу
+с теми же параметрами, и именем URL запроса. Параметры в журнал не
+попадают. Если SLOW_QUERY_THRESHOLD равен None, middleware снимает
+себя из цепочки. Команда analyze_slow_queries группирует журнал и
+подсказывает индексы. Запросы представлений, которые выполняются
+в пуле потоков, попадают в журнал так же, как в метрики.
+"""
+import json
+import re
+import threading
+import time
+
+from django.apps import apps
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import DatabaseError
+
+from .metrics import add_execute_wrapper
+
+write_lock = threading.Lock()
+
+
+class SlowQueryRecorder:
+    """
+    Обёртка для execute_wrapper: копит медленные запросы с планами.
+
+    Запрос, завершившийся ошибкой, не записывается и не объясняется.
+    """
+
+    def __init__(self, threshold):
+        self.threshold = threshold
+        self.records = []
+        self.explaining = False
+
+    def __call__(self, execute, sql, params, many, context):
+        if self.explaining:
+            return execute(sql, params, many, context)
+        started = time.perf_counter()
+        result = execute(sql, params, many, context)
+        duration = time.perf_counter() - started
+        if duration >= self.threshold:
+            self.records.append({
+                'sql': sql,
+                'duration_ms': round(duration * 1000, 3),
+                'plan': None if many else self.explain(
+                    context['connection'], sql, params
+                ),
+            })
+        return result
+
+    def explain(self, connection, sql, params):
+        if connection.vendor != 'sqlite':
+            return None
+        self.explaining = True
+        try:
+            with connection.cursor() as cursor:
+                cursor.execute('EXPLAIN QUERY PLAN ' + sql, params)
+                return [row[-1] for row in cursor.fetchall()]
+        except DatabaseError:
+            return None
+        finally:
+            self.explaining = False
+
+
+def write_records(url_name, records):
+    lines = ''.join(
+        json.dumps(
+            {'time': time.time(), 'url_name': url_name, **record},
+            ensure_ascii=False,
+        ) + '\n'
+        for record in records
+    )
+    with write_lock, open(settings.SLOW_QUERY_LOG, 'a') as log:
+        log.write(lines)
+
+
+class SlowQueryLogMiddleware:
+
+    def __init__(self, get_response):
+        if settings.SLOW_QUERY_THRESHOLD is None:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+
+    def __call__(self, request):
+        recorder = SlowQueryRecorder(settings.SLOW_QUERY_THRESHOLD)
+        with add_execute_wrapper(request, recorder):
+            response = self.get_response(request)
+        if recorder.records:
+            url_name = (
+                request.resolver_match.view_name
+                if request.resolver_match is not None else None
+            )
+            write_records(url_name, recorder.records)
+        return response
+
+
+IN_LIST = re.compile(r'IN \((?:%s|\?)(?:, (?:%s|\?))*\)')
+LITERAL = re.compile(r"'(?:[^']|'')*'|\b\d+(?:\.\d+)?\b")
+EQUALS = re.compile(r'"(\w+)"\."(\w+)" (?:= \?|IN \(\?\))')
+ORDER_BY = re.compile(r'ORDER BY (.+?)(?: LIMIT| OFFSET|$)')
+ORDER_COLUMN = re.compile(r'"(\w+)"\."(\w+)"')
+SCAN = re.compile(r'^SCAN (?:TABLE )?(\w+)')
+
+
+def normalize(sql):
+    """SQL без конкретных значений: параметры, литералы и списки IN."""
+    sql = ' '.join(sql.split()).replace('%s', '?')
+    sql = LITERAL.sub('?', sql)
+    return IN_LIST.sub('IN (?)', sql)
+
+
+def read_log(path):
+    """Записи журнала, сгруппированные по нормализованному SQL."""
+    groups = {}
+    with open(path) as log:
+        for line in log:
+            record = json.loads(line)
+            group = groups.setdefault(normalize(record['sql']), {
+                'count': 0,
+                'total_ms': 0,
+                'max_ms': 0,
+                'url_names': set(),
+                'plan': set(),
+            })
+            group['count'] += 1
+            group['total_ms'] += record['duration_ms']
+            group['max_ms'] = max(group['max_ms'], record['duration_ms'])
+            group['url_names'].add(record['url_name'] or '-')
+            group['plan'].update(record['plan'] or ())
+    return groups
+
+
+def full_scans(plan):
+    """Таблицы, которые план читает целиком, без индекса."""
+    return sorted({
+        match.group(1)
+        for detail in plan
+        if (match := SCAN.match(detail)) and ' USING ' not in detail
+    })
+
+
+def suggest_index(sql, table):
+    """
+    Составной индекс для таблицы: сначала столбцы из условий
+    равенства, затем столбцы сортировки. Возвращает поля модели и
+    саму модель или None, если подсказать нечего.
+    """
+    columns = [
+        column for column_table, column in EQUALS.findall(sql)
+        if column_table == table
+    ]
+    order_by = ORDER_BY.search(sql)
+    if order_by:
+        columns += [
+            column
+            for column_table, column in ORDER_COLUMN.findall(
+                order_by.group(1)
+            )
+            if column_table == table and column not in columns
+        ]
+    model = next(
+        (model for model in apps.get_models()
+         if model._meta.db_table == table),
+        None,
+    )
+    if not columns or model is None:
+        return None
+    by_column = {
+        field.column: field.name for field in model._meta.concrete_fields
+    }
+    return model, tuple(by_column.get(column, column) for column in columns)
@@ -0,0 +1,31 @@
+"""
+SQLite с настроенными соединениями.
+
+Каждое новое соединение получает PRAGMA из настроек SQLITE_*. Пишущие
+соединения включают WAL, в котором читатели не ждут писателя, и
+задают уровень synchronous; соединения, открытые с mode=ro, только
+читают и настройки журнала не трогают.
+"""
+from django.conf import settings
+from django.db.backends.sqlite3 import base
+
+
+class DatabaseWrapper(base.DatabaseWrapper):
+
+    def get_pragmas(self, conn_params):
+        pragmas = {
+            'busy_timeout': settings.SQLITE_BUSY_TIMEOUT,
+            'mmap_size': settings.SQLITE_MMAP_SIZE,
+        }
+        if 'mode=ro' in str(conn_params['database']):
+            pragmas['query_only'] = 'ON'
+        else:
+            pragmas['journal_mode'] = settings.SQLITE_JOURNAL_MODE
+            pragmas['synchronous'] = settings.SQLITE_SYNCHRONOUS
+        return pragmas
+
+    def get_new_connection(self, conn_params):
+        connection = super().get_new_connection(conn_params)
+        for name, value in self.get_pragmas(conn_params).items():
+            connection.execute(f'PRAGMA {name} = {value}')
+        return connection
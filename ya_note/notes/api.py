@@ -0,0 +1,261 @@
+"""
+JSON API для заметок.
+
+Клиент присылает пачку операций create/update/delete, и все они
+применяются одной транзакцией: либо вся пачка, либо ничего.
+Поля проверяются правилами NoteForm, заметки ищутся только среди
+заметок автора, как и в остальных представлениях.
+"""
+import json
+from http import HTTPStatus
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.http import JsonResponse
+from django.utils import timezone
+from django.views import generic
+
+from .autosave import DraftLocked, draft_lock, get_state, save_draft
+from .cache import bump_author_version
+from .forms import WARNING, NoteAutosaveForm, NoteBatchForm
+from .models import SyncCounter
+from .search import index_bulk_created, indexed_rows, update_index
+from .slugs import allocate_slugs
+from .sync import (
+    InvalidToken, delete_with_tombstones, get_changes, parse_token
+)
+from .views import NoteBase
+
+FIELDS = ('title', 'text', 'slug')
+OPERATIONS = ('create', 'update', 'delete')
+
+
+class BatchError(Exception):
+    """Пачка не прошла проверку; args[0] — ошибки по номерам операций."""
+
+
+class NoteBatch:
+
+    def __init__(self, author, queryset, operations):
+        self.author = author
+        self.queryset = queryset
+        self.operations = operations
+        self.errors = {}
+        self.forms = {}
+        self.deleted = []
+
+    def load_notes(self):
+        """Заметки, на которые ссылаются update и delete, одним запросом."""
+        slugs = {
+            operation['note'] for operation in self.operations
+            if operation.get('op') in ('update', 'delete')
+            and isinstance(operation.get('note'), str)
+        }
+        return {
+            note.slug: note for note in self.queryset.filter(slug__in=slugs)
+        }
+
+    def validate(self):
+        notes = self.load_notes()
+        for index, operation in enumerate(self.operations):
+            if operation.get('op') not in OPERATIONS:
+                self.errors[index] = {'op': ['Неизвестная операция.']}
+                continue
+            note = None
+            if operation['op'] != 'create':
+                note = notes.get(operation.get('note'))
+                if note is None:
+                    self.errors[index] = {'note': ['Заметка не найдена.']}
+                    continue
+            if operation['op'] == 'delete':
+                self.deleted.append(note)
+                continue
+            self.validate_form(index, operation, note)
+        self.validate_slugs()
+        if self.errors:
+            raise BatchError(self.errors)
+
+    def validate_form(self, index, operation, note):
+        data = {}
+        if note is not None:
+            data = {name: getattr(note, name) for name in FIELDS}
+        data.update(
+            (name, operation[name]) for name in FIELDS if name in operation
+        )
+        form = NoteBatchForm(data=data, instance=note)
+        if not form.is_valid():
+            self.errors[index] = {
+                name: list(messages) for name, messages in form.errors.items()
+            }
+            return
+        self.forms[index] = form
+
+    def validate_slugs(self):
+        """Явно заданные адреса не должны повторяться и быть заняты."""
+        wanted = {}
+        for index, form in self.forms.items():
+            slug = form.cleaned_data['slug']
+            if slug and slug in wanted:
+                self.errors[index] = {'slug': [slug + WARNING]}
+            elif slug:
+                wanted[slug] = index
+        freed = [note.pk for note in self.deleted]
+        for slug, pk in self.queryset.model.objects.filter(
+                slug__in=wanted
+        ).exclude(pk__in=freed).values_list('slug', 'pk'):
+            form = self.forms[wanted[slug]]
+            if form.instance.pk != pk:
+                self.errors[wanted[slug]] = {'slug': [slug + WARNING]}
+
+    def apply(self):
+        """Удаления, затем правки, затем новые заметки — одной транзакцией."""
+        notes = {
+            index: form.save(commit=False)
+            for index, form in self.forms.items()
+        }
+        self.allocate_slugs(notes.values())
+        created = [note for note in notes.values() if note.pk is None]
+        updated = [note for note in notes.values() if note.pk is not None]
+        for note in created:
+            note.author = self.author
+        now = timezone.now()
+        for note in updated:
+            note.updated_at = now
+        with transaction.atomic():
+            delete_with_tombstones(self.deleted)
+            if updated or created:
+                changes = SyncCounter.reserve(len(updated) + len(created))
+                for note, change in zip(updated + created, changes):
+                    note.change = change
+            model = self.queryset.model
+            stale = indexed_rows(
+                model.objects.filter(pk__in=[note.pk for note in updated])
+            )
+            model.objects.bulk_update(
+                updated, FIELDS + ('updated_at', 'change')
+            )
+            model.objects.bulk_create(created)
+            index_bulk_created(created)
+            update_index(removed=stale, added=[
+                (note.pk, note.title, note.text) for note in updated
+            ])
+        return [
+            {
+                'op': operation['op'],
+                'slug': (
+                    notes[index].slug if index in notes
+                    else operation['note']
+                ),
+            }
+            for index, operation in enumerate(self.operations)
+        ]
+
+    def allocate_slugs(self, notes):
+        """Пустые адреса подбираются по заголовкам одним запросом."""
+        blank = [note for note in notes if not note.slug]
+        if not blank:
+            return
+        reserved = {note.slug for note in notes if note.slug}
+        # Правленые заметки без адреса могут сохранить свои прежние адреса.
+        slugs = allocate_slugs(
+            [note.title for note in blank],
+            self.queryset.model.objects.exclude(
+                pk__in=[note.pk for note in blank if note.pk is not None]
+            ),
+            reserved,
+        )
+        for note, slug in zip(blank, slugs):
+            note.slug = slug
+
+
+class NoteBatchApi(NoteBase, generic.View):
+    """Пачка операций над заметками в формате JSON."""
+    raise_exception = True
+
+    def post(self, request, *args, **kwargs):
+        try:
+            operations = json.loads(request.body)['operations']
+        except (ValueError, KeyError, TypeError):
+            return JsonResponse(
+                {'errors': {'body': ['Ожидался объект с ключом operations.']}},
+                status=HTTPStatus.BAD_REQUEST,
+            )
+        if (
+            not isinstance(operations, list)
+            or not all(
+                isinstance(item, dict)
+                and isinstance(item.get('note', ''), str)
+                for item in operations
+            )
+            or len(operations) > settings.NOTES_API_BATCH_LIMIT
+        ):
+            return JsonResponse(
+                {'errors': {'operations': ['Некорректный список операций.']}},
+                status=HTTPStatus.BAD_REQUEST,
+            )
+        batch = NoteBatch(request.user, self.get_queryset(), operations)
+        try:
+            batch.validate()
+            results = batch.apply()
+        except BatchError as error:
+            return JsonResponse(
+                {'errors': error.args[0]}, status=HTTPStatus.BAD_REQUEST
+            )
+        except IntegrityError:
+            return JsonResponse(
+                {'errors': {'slug': ['Адрес заняли параллельно, повторите.']}},
+                status=HTTPStatus.CONFLICT,
+            )
+        bump_author_version(request.user.pk)
+        return JsonResponse({'results': results})
+
+
+class NoteChangesApi(NoteBase, generic.View):
+    """Заметки, изменённые и удалённые после токена since."""
+    raise_exception = True
+
+    def get(self, request, *args, **kwargs):
+        since = request.GET.get('since')
+        if since is not None:
+            try:
+                since = parse_token(since)
+            except InvalidToken:
+                return JsonResponse(
+                    {'errors': {'since': ['Некорректный токен.']}},
+                    status=HTTPStatus.BAD_REQUEST,
+                )
+        return JsonResponse(get_changes(request.user, since))
+
+
+class NoteAutosave(NoteBase, generic.detail.SingleObjectMixin, generic.View):
+    """
+    Частые правки заметки из формы редактирования.
+
+    Недостающие поля берутся из черновика или из самой заметки,
+    запись в базу откладывает notes.autosave.
+    """
+    raise_exception = True
+
+    def post(self, request, *args, **kwargs):
+        note = self.get_object()
+        try:
+            with draft_lock(note.pk):
+                data = {
+                    name: request.POST.get(name, value)
+                    for name, value in get_state(note).items()
+                }
+                form = NoteAutosaveForm(data=data, instance=note)
+                if not form.is_valid():
+                    return JsonResponse(
+                        {'errors': form.errors},
+                        status=HTTPStatus.BAD_REQUEST,
+                    )
+                saved = save_draft(
+                    note, form.cleaned_data, flush='flush' in request.POST
+                )
+        except DraftLocked:
+            return JsonResponse(
+                {'errors': {'note': ['Черновик занят, повторите.']}},
+                status=HTTPStatus.CONFLICT,
+            )
+        return JsonResponse({'saved': saved})
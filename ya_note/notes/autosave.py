@@ -0,0 +1,147 @@
+"""
+Автосохранение заметок при редактировании.
+
+Черновик правок копится в кэше по заметке, а в базу попадает не чаще
+одного раза за NOTES_AUTOSAVE_INTERVAL секунд: первый запрос интервала
+занимает ключ через cache.add и записывает последнее состояние,
+остальные только обновляют черновик. Хвост правок записывается
+запросом с flush, обычным сохранением формы или таймером процесса,
+который срабатывает через интервал после первой незаписанной правки.
+Так черновик попадает в базу не позже чем через интервал, а число
+записей ограничено интервалом, как бы часто клиент ни присылал правки.
+
+Чтение черновика, слияние правок и запись идут под блокировкой
+заметки в кэше (cache.add), поэтому параллельные правки не теряются.
+"""
+import threading
+import time
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connection, transaction
+from django.utils import timezone
+
+from .cache import bump_author_version
+from .models import Note, SyncCounter
+from .search import indexed_rows, update_index
+
+FIELDS = ('title', 'text')
+DRAFT_KEY = 'notes:draft:{note_id}'
+FLUSH_KEY = 'notes:draft:{note_id}:flush'
+LOCK_KEY = 'notes:draft:{note_id}:lock'
+LOCK_POLL = 0.01
+
+timers = {}
+timers_lock = threading.Lock()
+
+
+class DraftLocked(Exception):
+    """Черновик заметки не удалось заблокировать за отведённое время."""
+
+
+@contextmanager
+def draft_lock(note_id):
+    """Блокировка черновика заметки в кэше по умолчанию."""
+    key = LOCK_KEY.format(note_id=note_id)
+    timeout = settings.NOTES_AUTOSAVE_LOCK_TIMEOUT
+    deadline = time.monotonic() + timeout
+    while not cache.add(key, True, timeout):
+        if time.monotonic() > deadline:
+            raise DraftLocked(note_id)
+        time.sleep(LOCK_POLL)
+    try:
+        yield
+    finally:
+        cache.delete(key)
+
+
+def get_draft(note):
+    """Несохранённые правки заметки или None."""
+    return cache.get(DRAFT_KEY.format(note_id=note.pk))
+
+
+def get_state(note):
+    """Последнее состояние заметки с учётом черновика."""
+    return get_draft(note) or {name: getattr(note, name) for name in FIELDS}
+
+
+def cancel_timer(note_id):
+    with timers_lock:
+        timer = timers.pop(note_id, None)
+    if timer is not None:
+        timer.cancel()
+
+
+def schedule_flush(note_id):
+    """Запускает таймер записи черновика, если он ещё не запущен."""
+    with timers_lock:
+        if note_id in timers:
+            return
+        timer = threading.Timer(
+            settings.NOTES_AUTOSAVE_INTERVAL, flush_draft, (note_id,)
+        )
+        timer.daemon = True
+        timers[note_id] = timer
+    timer.start()
+
+
+def discard_draft(note):
+    """Черновик больше не нужен: форма сохранила заметку целиком."""
+    cancel_timer(note.pk)
+    cache.delete(DRAFT_KEY.format(note_id=note.pk))
+
+
+def write_draft(note_id, author_id, draft):
+    with transaction.atomic():
+        notes = Note.objects.filter(pk=note_id)
+        stale = indexed_rows(notes)
+        if notes.update(
+            updated_at=timezone.now(), change=SyncCounter.reserve()[0],
+            **draft
+        ):
+            update_index(
+                removed=stale,
+                added=[(note_id, draft['title'], draft['text'])],
+            )
+    cache.delete(DRAFT_KEY.format(note_id=note_id))
+    bump_author_version(author_id)
+
+
+def flush_draft(note_id):
+    """Записывает черновик по таймеру; вызывается в потоке таймера."""
+    with timers_lock:
+        timers.pop(note_id, None)
+    try:
+        with draft_lock(note_id):
+            draft = cache.get(DRAFT_KEY.format(note_id=note_id))
+            author_id = Note.objects.filter(pk=note_id).values_list(
+                'author_id', flat=True
+            ).first()
+            if draft is not None and author_id is not None:
+                write_draft(note_id, author_id, draft)
+    except DraftLocked:
+        schedule_flush(note_id)
+    finally:
+        connection.close()
+
+
+def save_draft(note, changes, flush=False):
+    """
+    Кладёт правки в черновик и при необходимости пишет его в базу.
+
+    Вызывается под draft_lock. Возвращает True, если черновик записан
+    в базу; иначе запись откладывается таймером.
+    """
+    draft = get_state(note)
+    draft.update(changes)
+    cache.set(DRAFT_KEY.format(note_id=note.pk), draft, None)
+    if not flush and not cache.add(
+            FLUSH_KEY.format(note_id=note.pk), True,
+            settings.NOTES_AUTOSAVE_INTERVAL
+    ):
+        schedule_flush(note.pk)
+        return False
+    cancel_timer(note.pk)
+    write_draft(note.pk, note.author_id, draft)
+    return True
@@ -0,0 +1,48 @@
+import hashlib
+import time
+from http import HTTPStatus
+
+from django.conf import settings
+from django.core.cache import cache
+
+AUTHOR_VERSION_KEY = 'notes:{author_id}:version'
+PAGE_KEY = 'notes:{author_id}:page:{version}:{path}'
+
+
+def get_author_version(author_id):
+    """
+    Версия заметок автора, часть ключа каждой его страницы.
+
+    Начальное значение берётся из часов: если ключ версии вытеснят
+    из кэша, старые страницы по новой версии уже не найдутся.
+    """
+    return cache.get_or_set(
+        AUTHOR_VERSION_KEY.format(author_id=author_id), time.time_ns, None
+    )
+
+
+def bump_author_version(author_id):
+    """Все закэшированные страницы автора разом становятся устаревшими."""
+    key = AUTHOR_VERSION_KEY.format(author_id=author_id)
+    try:
+        cache.incr(key)
+    except ValueError:
+        cache.set(key, time.time_ns(), None)
+
+
+def get_cached_page(request, render_page):
+    """Страница пользователя из кэша или, при промахе, из render_page()."""
+    author_id = request.user.pk
+    key = PAGE_KEY.format(
+        author_id=author_id,
+        version=get_author_version(author_id),
+        path=hashlib.md5(request.get_full_path().encode()).hexdigest(),
+    )
+    response = cache.get(key)
+    if response is None:
+        response = render_page()
+        if hasattr(response, 'render'):
+            response.render()
+        if response.status_code == HTTPStatus.OK and not response.cookies:
+            cache.set(key, response, settings.NOTES_CACHE_TIMEOUT)
+    return response
@@ -0,0 +1,65 @@
+"""
+Сжатое хранение длинных текстов заметок.
+
+Текст длиннее NOTES_TEXT_COMPRESSION_THRESHOLD байт записывается
+в ту же колонку как BLOB со сжатием zlib, короткие тексты остаются
+строками. SQLite хранит в колонке значение любого типа, поэтому режим
+включается только для неё. Распаковка ленивая: модель держит байты,
+пока к полю не обратятся, а values() и values_list() отдают значения
+как есть, и их читатели распаковывают текст через decompress.
+"""
+import zlib
+
+from django.conf import settings
+from django.db import models
+from django.db.models.query_utils import DeferredAttribute
+
+COMPRESSION_LEVEL = 6
+
+
+def compress(text):
+    """Сжатые байты текста или сам текст, если сжатие не окупается."""
+    data = text.encode()
+    if (
+        not settings.NOTES_TEXT_COMPRESSION
+        or len(data) < settings.NOTES_TEXT_COMPRESSION_THRESHOLD
+    ):
+        return text
+    packed = zlib.compress(data, COMPRESSION_LEVEL)
+    return packed if len(packed) < len(data) else text
+
+
+def decompress(value):
+    """Текст из значения колонки, сжатого или нет."""
+    if isinstance(value, (bytes, memoryview)):
+        return zlib.decompress(value).decode()
+    return value
+
+
+class CompressedTextDescriptor(DeferredAttribute):
+    """
+    Распаковывает текст при первом обращении и запоминает его.
+
+    В отличие от DeferredAttribute, дескриптор перехватывает и запись,
+    иначе значение в __dict__ экземпляра скрыло бы его __get__.
+    """
+
+    def __get__(self, instance, cls=None):
+        value = super().__get__(instance, cls)
+        if isinstance(value, (bytes, memoryview)):
+            value = decompress(value)
+            instance.__dict__[self.field.attname] = value
+        return value
+
+    def __set__(self, instance, value):
+        instance.__dict__[self.field.attname] = value
+
+
+class CompressedTextField(models.TextField):
+    descriptor_class = CompressedTextDescriptor
+
+    def get_db_prep_value(self, value, connection, prepared=False):
+        value = super().get_db_prep_value(value, connection, prepared)
+        if isinstance(value, str) and connection.vendor == 'sqlite':
+            return compress(value)
+        return value
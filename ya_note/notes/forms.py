@@ -1,9 +1,8 @@
-from pytils.translit import slugify
-
 from django import forms
 from django.core.exceptions import ValidationError
 
 from .models import Note
+from .transfer import FORMATS
 
 WARNING = ' - такой slug уже существует, придумайте уникальное значение!'
 
@@ -16,14 +15,43 @@ class NoteForm(forms.ModelForm):
         fields = ('title', 'text', 'slug')
 
     def clean_slug(self):
-        """Обрабатывает случай, если slug не уникален."""
-        cleaned_data = super().clean()
-        slug = cleaned_data.get('slug')
-        if not slug:
-            title = cleaned_data.get('title')
-            slug = slugify(title)[:100]
-        if Note.objects.filter(
+        """
+        Обрабатывает случай, если slug не уникален.
+
+        Пустой slug оставляем пустым: свободный адрес по заголовку
+        подберёт модель при сохранении.
+        """
+        slug = self.cleaned_data.get('slug')
+        if slug and Note.objects.filter(
                 slug=slug
         ).exclude(id=self.instance.pk).exists():
             raise ValidationError(slug + WARNING)
         return slug
+
+
+class NoteImportForm(forms.Form):
+    """Файл с заметками для импорта."""
+    file = forms.FileField(label='Файл')
+    format = forms.ChoiceField(label='Формат', choices=FORMATS)
+
+
+class NoteBatchForm(NoteForm):
+    """
+    Правила NoteForm без запросов к базе.
+
+    Уникальность адресов проверяется сразу для всей пачки операций.
+    """
+
+    def clean_slug(self):
+        return self.cleaned_data.get('slug')
+
+    def validate_unique(self):
+        pass
+
+
+class NoteAutosaveForm(forms.ModelForm):
+    """Правки заголовка и текста из автосохранения."""
+
+    class Meta:
+        model = Note
+        fields = ('title', 'text')
@@ -0,0 +1,89 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+
+from notes.fields import compress, decompress
+from notes.models import Note
+
+SIZE_SQL = (
+    'SELECT COALESCE(SUM(LENGTH(CAST(text AS BLOB))), 0) FROM notes_note'
+)
+UPDATE_SQL = 'UPDATE notes_note SET text = %s WHERE id = %s'
+PAGES_SQL = (
+    'SELECT page_count - freelist_count, page_size '
+    'FROM pragma_page_count, pragma_freelist_count, pragma_page_size'
+)
+
+
+def stored_size():
+    """Сколько байт занимают тексты заметок в таблице."""
+    with connection.cursor() as cursor:
+        cursor.execute(SIZE_SQL)
+        return cursor.fetchone()[0]
+
+
+def database_size():
+    """Сколько байт базы заняты данными, без свободных страниц."""
+    with connection.cursor() as cursor:
+        cursor.execute(PAGES_SQL)
+        pages, page_size = cursor.fetchone()
+        return pages * page_size
+
+
+class Command(BaseCommand):
+    help = (
+        'Сжимает или распаковывает тексты существующих заметок пачками '
+        '(только SQLite).'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=500,
+            help='Сколько заметок переписывать в одной транзакции.',
+        )
+        parser.add_argument(
+            '--decompress',
+            action='store_true',
+            help='Вернуть все тексты к несжатому виду.',
+        )
+
+    def handle(self, *args, **options):
+        if connection.vendor != 'sqlite':
+            raise CommandError('Сжатые тексты хранятся только в SQLite.')
+        if not options['decompress'] and not settings.NOTES_TEXT_COMPRESSION:
+            raise CommandError('Сначала включите NOTES_TEXT_COMPRESSION.')
+        convert = decompress if options['decompress'] else (
+            lambda value: compress(decompress(value))
+        )
+        size_before = stored_size()
+        database_before = database_size()
+        started = time.perf_counter()
+        changed = last_pk = 0
+        while True:
+            rows = list(
+                Note.objects.filter(pk__gt=last_pk).order_by('pk').values_list(
+                    'pk', 'text'
+                )[:options['batch_size']]
+            )
+            if not rows:
+                break
+            last_pk = rows[-1][0]
+            updates = []
+            for pk, text in rows:
+                value = convert(text)
+                if type(value) is not type(text):
+                    updates.append((value, pk))
+            with transaction.atomic(), connection.cursor() as cursor:
+                cursor.executemany(UPDATE_SQL, updates)
+            changed += len(updates)
+        self.stdout.write(
+            f'Переписано заметок: {changed} за '
+            f'{time.perf_counter() - started:.2f} с; тексты занимали '
+            f'{size_before} байт, теперь {stored_size()} байт; '
+            f'данные базы занимали {database_before} байт, теперь '
+            f'{database_size()} байт. Файл базы уменьшится после VACUUM.'
+        )
@@ -0,0 +1,47 @@
+from pathlib import Path
+
+from django.contrib.auth import get_user_model
+from django.core.exceptions import ValidationError
+from django.core.management.base import BaseCommand, CommandError
+
+from notes.transfer import FORMATS, import_notes, read_records
+
+
+class Command(BaseCommand):
+    help = 'Импортирует заметки пользователя из файла JSON Lines или CSV.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('username', help='Автор заметок.')
+        parser.add_argument('path', type=Path, help='Файл с заметками.')
+        parser.add_argument(
+            '--format',
+            choices=[name for name, _ in FORMATS],
+            help='Формат файла; по умолчанию определяется по расширению.',
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            help='Сколько заметок вставлять в одной транзакции.',
+        )
+
+    def handle(self, *args, **options):
+        try:
+            author = get_user_model().objects.get(
+                username=options['username']
+            )
+        except get_user_model().DoesNotExist:
+            raise CommandError('Пользователь не найден.')
+        path = options['path']
+        fmt = options['format'] or (
+            'csv' if path.suffix.lower() == '.csv' else 'jsonl'
+        )
+        with path.open('rb') as stream:
+            try:
+                created = import_notes(
+                    read_records(stream, fmt),
+                    author,
+                    options['batch_size'],
+                )
+            except ValidationError as error:
+                raise CommandError('; '.join(error.messages))
+        self.stdout.write(f'Импортировано заметок: {created}')
@@ -0,0 +1,46 @@
+from pathlib import Path
+
+from django.core.management.base import BaseCommand, CommandError
+
+from yanote.profiling import categorize, read_profiles
+
+
+class Command(BaseCommand):
+    help = (
+        'Сводит профили запросов в один файл folded для flame graph; '
+        'время шаблонов и ORM помечено кадрами [template] и [ORM].'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--url-name',
+            help='Только профили этого имени URL, например notes:list.',
+        )
+        parser.add_argument(
+            '--output',
+            type=Path,
+            help='Файл для результата; по умолчанию вывод в консоль.',
+        )
+
+    def handle(self, *args, **options):
+        stacks = read_profiles(options['url_name'])
+        if not stacks:
+            raise CommandError('Профилей не найдено.')
+        lines = []
+        totals = dict.fromkeys(('[template]', '[ORM]'), 0)
+        for stack, count in sorted(stacks.items()):
+            stack, category = categorize(stack)
+            if category is not None:
+                totals[category] += count
+            lines.append(f'{stack} {count}\n')
+        if options['output']:
+            options['output'].write_text(''.join(lines))
+        else:
+            self.stdout.write(''.join(lines), ending='')
+        samples = sum(stacks.values())
+        self.stderr.write(
+            f'Снимков: {samples}; ' + ', '.join(
+                f'{category} {count * 100 / samples:.1f}%'
+                for category, count in totals.items()
+            )
+        )
@@ -0,0 +1,51 @@
+from django.db import migrations
+
+CREATE_SQL = (
+    'CREATE VIRTUAL TABLE notes_note_fts USING fts5(title, text)',
+    'INSERT INTO notes_note_fts (rowid, title, text) '
+    'SELECT id, title, text FROM notes_note',
+    '''
+    CREATE TRIGGER notes_note_fts_insert AFTER INSERT ON notes_note BEGIN
+        INSERT INTO notes_note_fts (rowid, title, text)
+        VALUES (new.id, new.title, new.text);
+    END
+    ''',
+    '''
+    CREATE TRIGGER notes_note_fts_delete AFTER DELETE ON notes_note BEGIN
+        DELETE FROM notes_note_fts WHERE rowid = old.id;
+    END
+    ''',
+    '''
+    CREATE TRIGGER notes_note_fts_update AFTER UPDATE OF title, text
+    ON notes_note BEGIN
+        UPDATE notes_note_fts SET title = new.title, text = new.text
+        WHERE rowid = new.id;
+    END
+    ''',
+)
+DROP_SQL = (
+    'DROP TRIGGER IF EXISTS notes_note_fts_update',
+    'DROP TRIGGER IF EXISTS notes_note_fts_delete',
+    'DROP TRIGGER IF EXISTS notes_note_fts_insert',
+    'DROP TABLE IF EXISTS notes_note_fts',
+)
+
+
+def run_sql(statements):
+    def run(apps, schema_editor):
+        if schema_editor.connection.vendor != 'sqlite':
+            return
+        for sql in statements:
+            schema_editor.execute(sql)
+    return run
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('notes', '0002_note_author_id_idx'),
+    ]
+
+    operations = [
+        migrations.RunPython(run_sql(CREATE_SQL), run_sql(DROP_SQL)),
+    ]
@@ -0,0 +1,59 @@
+import zlib
+from itertools import islice
+
+from django.db import migrations
+
+TRIGGERS = (
+    'notes_note_fts_update',
+    'notes_note_fts_delete',
+    'notes_note_fts_insert',
+)
+INSERT_SQL = (
+    'INSERT INTO notes_note_fts (rowid, title, text) VALUES (%s, %s, %s)'
+)
+BATCH_SIZE = 500
+
+
+def decompress(value):
+    if isinstance(value, (bytes, memoryview)):
+        return zlib.decompress(value).decode()
+    return value
+
+
+def recreate(options):
+    """Пересоздаёт индекс и наполняет его распакованными текстами."""
+    def run(apps, schema_editor):
+        if schema_editor.connection.vendor != 'sqlite':
+            return
+        for name in TRIGGERS:
+            schema_editor.execute(f'DROP TRIGGER IF EXISTS {name}')
+        schema_editor.execute('DROP TABLE IF EXISTS notes_note_fts')
+        schema_editor.execute(
+            f'CREATE VIRTUAL TABLE notes_note_fts USING fts5({options})'
+        )
+        rows = apps.get_model('notes', 'Note').objects.order_by(
+            'pk'
+        ).values_list('pk', 'title', 'text').iterator(chunk_size=BATCH_SIZE)
+        with schema_editor.connection.cursor() as cursor:
+            while True:
+                batch = [
+                    (pk, title, decompress(text))
+                    for pk, title, text in islice(rows, BATCH_SIZE)
+                ]
+                if not batch:
+                    return
+                cursor.executemany(INSERT_SQL, batch)
+    return run
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('notes', '0007_sync_change_counter'),
+    ]
+
+    operations = [
+        migrations.RunPython(
+            recreate("title, text, content=''"), recreate('title, text')
+        ),
+    ]
@@ -1,7 +1,45 @@
 from django.conf import settings
-from django.db import models
+from django.db import IntegrityError, models, transaction
+from django.db.models import F
 
-from pytils.translit import slugify
+from .fields import CompressedTextField
+from .slugs import allocate_slug
+
+SLUG_ATTEMPTS = 3
+
+
+class SyncCounter(models.Model):
+    """
+    Единственная строка со счётчиком изменений заметок.
+
+    value — последний выданный номер изменения, pruned — наибольший
+    номер удалённого по сроку хранения следа.
+    """
+    value = models.PositiveBigIntegerField(default=0)
+    pruned = models.PositiveBigIntegerField(default=0)
+
+    @classmethod
+    def reserve(cls, count=1):
+        """
+        Номера для count изменений; вызывается в транзакции записи.
+
+        UPDATE держит блокировку строки счётчика до конца транзакции,
+        поэтому номера фиксируются строго по возрастанию и читатель
+        не увидит номер больше того, что уже записан вместе с данными.
+        """
+        with transaction.atomic():
+            if not cls.objects.filter(pk=1).update(value=F('value') + count):
+                cls.objects.get_or_create(pk=1)
+                cls.objects.filter(pk=1).update(value=F('value') + count)
+            value = cls.objects.values_list('value', flat=True).get(pk=1)
+        return range(value - count + 1, value + 1)
+
+    @classmethod
+    def state(cls):
+        """Последний номер изменения и граница удалённых следов."""
+        return cls.objects.filter(pk=1).values_list(
+            'value', 'pruned'
+        ).first() or (0, 0)
 
 
 class Note(models.Model):
@@ -11,7 +49,7 @@ class Note(models.Model):
         default='Название заметки',
         help_text='Дайте короткое название заметке'
     )
-    text = models.TextField(
+    text = CompressedTextField(
         'Текст',
         help_text='Добавьте подробностей'
     )
@@ -27,15 +65,104 @@ class Note(models.Model):
         settings.AUTH_USER_MODEL,
         on_delete=models.CASCADE,
     )
+    updated_at = models.DateTimeField('Изменена', auto_now=True)
+    change = models.PositiveBigIntegerField(default=0, editable=False)
 
     def __str__(self):
         return self.title
 
     def save(self, *args, **kwargs):
-        if not self.slug:
-            max_slug_length = self._meta.get_field('slug').max_length
-            self.slug = slugify(self.title)[:max_slug_length]
-        super().save(*args, **kwargs)
+        """
+        Пустой slug заменяется свободным адресом по заголовку.
+
+        Если параллельный запрос успел занять тот же адрес, уникальный
+        индекс отклонит вставку, и адрес подбирается заново. Номер
+        изменения для синхронизации выдаётся в той же транзакции.
+        """
+        if kwargs.get('update_fields') is not None:
+            kwargs['update_fields'] = {*kwargs['update_fields'], 'change'}
+        if self.slug:
+            with transaction.atomic():
+                self.change = SyncCounter.reserve()[0]
+                return super().save(*args, **kwargs)
+        # Заметка без адреса может сохранить свой прежний адрес.
+        others = Note.objects.exclude(pk=self.pk) if self.pk else (
+            Note.objects.all()
+        )
+        for attempt in range(1, SLUG_ATTEMPTS + 1):
+            self.slug = allocate_slug(self.title, others)
+            try:
+                with transaction.atomic():
+                    self.change = SyncCounter.reserve()[0]
+                    return super().save(*args, **kwargs)
+            except IntegrityError:
+                self.slug = ''
+                if attempt == SLUG_ATTEMPTS:
+                    raise
 
     class Meta:
         get_latest_by = 'pk'
+        indexes = (
+            models.Index(fields=('author', 'id'), name='note_author_id_idx'),
+            models.Index(
+                fields=('author', 'change'),
+                name='note_author_change_idx',
+            ),
+        )
+
+
+class NoteTombstone(models.Model):
+    """След удалённой заметки для синхронизации клиентов."""
+    author = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+    )
+    note_id = models.BigIntegerField()
+    slug = models.SlugField(max_length=100, db_index=False)
+    deleted_at = models.DateTimeField(auto_now_add=True)
+    change = models.PositiveBigIntegerField(default=0)
+
+    class Meta:
+        indexes = (
+            models.Index(
+                fields=('author', 'deleted_at'),
+                name='tombstone_author_deleted_idx',
+            ),
+            models.Index(
+                fields=('author', 'change'),
+                name='tombstone_author_change_idx',
+            ),
+        )
+
+    def __str__(self):
+        return self.slug
+
+
+class NoteRevision(models.Model):
+    """
+    Ревизия заметки.
+
+    Полный текст хранится только в снимках, остальные ревизии содержат
+    построчную разницу с предыдущей ревизией в JSON.
+    """
+    note = models.ForeignKey(
+        Note,
+        on_delete=models.CASCADE,
+        related_name='revisions',
+    )
+    number = models.PositiveIntegerField()
+    title = models.CharField(max_length=100)
+    is_snapshot = models.BooleanField(default=False)
+    data = CompressedTextField()
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        ordering = ('-number',)
+        constraints = (
+            models.UniqueConstraint(
+                fields=('note', 'number'), name='note_revision_number_uniq'
+            ),
+        )
+
+    def __str__(self):
+        return f'{self.note_id}:{self.number}'
@@ -0,0 +1,88 @@
+"""
+История правок заметок.
+
+Каждая ревизия хранит заголовок целиком, а текст — построчной разницей
+с предыдущей ревизией: список замен [начало, конец, новые строки].
+Каждая NOTES_REVISION_SNAPSHOT_EVERY-я ревизия — полный снимок текста,
+поэтому ревизия восстанавливается одним запросом от ближайшего снимка
+и не больше чем NOTES_REVISION_SNAPSHOT_EVERY применениями разницы.
+"""
+import json
+from difflib import SequenceMatcher
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Subquery
+
+from .models import NoteRevision
+
+
+def make_delta(old, new):
+    """Замены, превращающие строки old в строки new."""
+    old_lines = old.splitlines(keepends=True)
+    new_lines = new.splitlines(keepends=True)
+    return [
+        [i1, i2, new_lines[j1:j2]]
+        for tag, i1, i2, j1, j2 in SequenceMatcher(
+            None, old_lines, new_lines, autojunk=False
+        ).get_opcodes()
+        if tag != 'equal'
+    ]
+
+
+def apply_delta(text, delta):
+    lines = text.splitlines(keepends=True)
+    result = []
+    position = 0
+    for start, end, replacement in delta:
+        result.extend(lines[position:start])
+        result.extend(replacement)
+        position = end
+    result.extend(lines[position:])
+    return ''.join(result)
+
+
+def get_revision(note, number):
+    """Заголовок и текст ревизии number или None, если её нет."""
+    snapshot = note.revisions.filter(
+        number__lte=number, is_snapshot=True
+    ).order_by('-number').values('number')[:1]
+    revisions = list(
+        note.revisions.filter(
+            number__lte=number, number__gte=Subquery(snapshot)
+        ).order_by('number')
+    )
+    if not revisions or revisions[-1].number != number:
+        return None
+    text = revisions[0].data
+    for revision in revisions[1:]:
+        text = apply_delta(text, json.loads(revision.data))
+    return revisions[-1].title, text
+
+
+def record_revision(note):
+    """
+    Записывает текущее состояние заметки новой ревизией.
+
+    Если состояние совпадает с последней ревизией, ничего не пишется.
+    """
+    with transaction.atomic():
+        last = note.revisions.only('number').first()
+        if last is None:
+            number, text = 1, None
+        else:
+            number = last.number + 1
+            title, text = get_revision(note, last.number)
+            if text == note.text and title == note.title:
+                return
+        if (number - 1) % settings.NOTES_REVISION_SNAPSHOT_EVERY == 0:
+            NoteRevision.objects.create(
+                note=note, number=number, title=note.title,
+                is_snapshot=True, data=note.text,
+            )
+            return
+        delta = make_delta(text, note.text)
+        NoteRevision.objects.create(
+            note=note, number=number, title=note.title,
+            data=json.dumps(delta, ensure_ascii=False),
+        )
@@ -0,0 +1,124 @@
+"""
+Полнотекстовый поиск по заметкам.
+
+В SQLite используется бестекстовая (content='') таблица FTS5
+notes_note_fts: она хранит только индекс, а сами тексты лежат
+в notes_note, в том числе сжатыми. Индекс пополняется из Python —
+сигналами модели и явными вызовами на путях массовой записи, — поэтому
+схема не зависит от функций, зарегистрированных приложением, и в базу
+можно писать любым клиентом SQLite. Удаление строки из такого индекса
+требует прежних значений колонок, их дают indexed_rows(). На других
+базах поиск откатывается к icontains.
+"""
+from itertools import islice
+
+from django.db import DEFAULT_DB_ALIAS, connection, connections
+from django.db.models import Q
+
+from .fields import decompress
+from .models import Note
+
+SEARCH_SQL = '''
+    SELECT note.id, note.title, note.slug
+    FROM notes_note_fts
+    JOIN notes_note AS note ON note.id = notes_note_fts.rowid
+    WHERE notes_note_fts MATCH %s AND note.author_id = %s
+    ORDER BY notes_note_fts.rank
+    LIMIT %s
+'''
+INDEX_SQL = (
+    'INSERT INTO notes_note_fts (rowid, title, text) VALUES (%s, %s, %s)'
+)
+UNINDEX_SQL = (
+    'INSERT INTO notes_note_fts (notes_note_fts, rowid, title, text) '
+    "VALUES ('delete', %s, %s, %s)"
+)
+CLEAR_SQL = "INSERT INTO notes_note_fts (notes_note_fts) VALUES ('delete-all')"
+REBUILD_BATCH_SIZE = 500
+
+
+def to_match_query(query):
+    """
+    Запрос FTS5 из пользовательской строки.
+
+    Каждое слово берётся в кавычки, чтобы спецсимволы FTS5 не ломали
+    запрос, и ищется как префикс: «заметк» найдёт «заметки».
+    """
+    return ' '.join(
+        '"{}"*'.format(word.replace('"', '""')) for word in query.split()
+    )
+
+
+def search_notes(author, query, limit):
+    """Заметки автора по запросу, самые релевантные первыми."""
+    if connection.vendor != 'sqlite':
+        return list(
+            Note.objects.filter(author=author).filter(
+                Q(title__icontains=query) | Q(text__icontains=query)
+            ).only('id', 'title', 'slug')[:limit]
+        )
+    return list(
+        Note.objects.raw(SEARCH_SQL, [to_match_query(query), author.pk, limit])
+    )
+
+
+def indexed_rows(queryset):
+    """Строки индекса для заметок: id, заголовок и распакованный текст."""
+    return [
+        (pk, title, decompress(text))
+        for pk, title, text in queryset.values_list('pk', 'title', 'text')
+    ]
+
+
+def update_index(removed=(), added=(), using=DEFAULT_DB_ALIAS):
+    """
+    Убирает из индекса строки removed и добавляет строки added.
+
+    Строки — кортежи (id, заголовок, текст); для удаления нужны
+    значения, с которыми строка была проиндексирована.
+    """
+    connection = connections[using]
+    if connection.vendor != 'sqlite' or not (removed or added):
+        return
+    with connection.cursor() as cursor:
+        if removed:
+            cursor.executemany(UNINDEX_SQL, list(removed))
+        if added:
+            cursor.executemany(INDEX_SQL, list(added))
+
+
+def index_bulk_created(notes):
+    """
+    Индексирует заметки после bulk_create.
+
+    SQLite не возвращает id вставленных строк, поэтому они ищутся
+    по уникальным адресам.
+    """
+    notes = list(notes)
+    if connection.vendor != 'sqlite' or not notes:
+        return
+    ids = dict(
+        Note.objects.filter(
+            slug__in=[note.slug for note in notes]
+        ).values_list('slug', 'pk')
+    )
+    update_index(added=[
+        (ids[note.slug], note.title, note.text) for note in notes
+    ])
+
+
+def rebuild_index(batch_size=REBUILD_BATCH_SIZE):
+    """Заново наполняет индекс из таблицы заметок."""
+    with connection.cursor() as cursor:
+        cursor.execute(CLEAR_SQL)
+    rows = Note.objects.order_by('pk').values_list(
+        'pk', 'title', 'text'
+    ).iterator(chunk_size=batch_size)
+    while True:
+        batch = [
+            (pk, title, decompress(text))
+            for pk, title, text in islice(rows, batch_size)
+        ]
+        if not batch:
+            return
+        update_index(added=batch)
@@ -0,0 +1,20 @@
+"""
+Сессии в двухуровневом кэше с записью в базу.
+
+Разобранная сессия сначала ищется в локальном кэше процесса, затем
+в общем кэше и только потом в базе; выход из системы удаляет её
+со всех уровней.
+"""
+from django.conf import settings
+from django.contrib.sessions.backends import cached_db
+
+from yanote.twotier import TwoTierCache
+
+session_cache = TwoTierCache('sessions', settings.SESSION_CACHE_ALIAS)
+
+
+class SessionStore(cached_db.SessionStore):
+
+    def __init__(self, session_key=None):
+        super().__init__(session_key)
+        self._cache = session_cache
@@ -0,0 +1,73 @@
+from django.conf import settings
+from django.contrib.auth.signals import user_logged_out
+from django.db import transaction
+from django.db.models.signals import (
+    post_delete, post_save, pre_delete, pre_save
+)
+from django.dispatch import receiver
+
+from .auth import invalidate_user
+from .cache import bump_author_version
+from .models import Note
+from .search import indexed_rows, update_index
+
+INDEXED_FIELDS = {'title', 'text'}
+
+
+def touches_index(update_fields):
+    return update_fields is None or bool(INDEXED_FIELDS & set(update_fields))
+
+
+@receiver(pre_save, sender=Note)
+def remember_indexed_row(sender, instance, using, update_fields, **kwargs):
+    """Прежняя строка индекса нужна, чтобы убрать её после записи."""
+    instance._indexed_rows = []
+    if instance.pk is not None and touches_index(update_fields):
+        instance._indexed_rows = indexed_rows(
+            Note.objects.using(using).filter(pk=instance.pk)
+        )
+
+
+@receiver(post_save, sender=Note)
+def index_saved_note(sender, instance, using, update_fields, **kwargs):
+    if touches_index(update_fields):
+        update_index(
+            removed=instance.__dict__.pop('_indexed_rows', []),
+            added=[(instance.pk, instance.title, instance.text)],
+            using=using,
+        )
+
+
+@receiver(pre_delete, sender=Note)
+def unindex_deleted_note(sender, instance, using, **kwargs):
+    """До удаления, пока отложенные поля ещё можно дочитать из базы."""
+    update_index(
+        removed=[(instance.pk, instance.title, instance.text)], using=using
+    )
+
+
+@receiver(post_save, sender=Note)
+@receiver(post_delete, sender=Note)
+def forget_author_pages(sender, instance, using, **kwargs):
+    """
+    Сбрасывает закэшированные страницы автора при любой записи заметки.
+
+    Так сразу видны и правки из админки и команд. Сброс ждёт фиксации
+    транзакции, иначе параллельный запрос успел бы закэшировать старые
+    данные под новой версией.
+    """
+    author_id = instance.author_id
+    transaction.on_commit(lambda: bump_author_version(author_id), using)
+
+
+@receiver(post_save, sender=settings.AUTH_USER_MODEL)
+@receiver(post_delete, sender=settings.AUTH_USER_MODEL)
+def forget_cached_user(sender, instance, **kwargs):
+    """Правка пользователя, в том числе смена пароля, сбрасывает слепок."""
+    invalidate_user(instance.pk)
+
+
+@receiver(user_logged_out)
+def forget_logged_out_user(sender, request, user, **kwargs):
+    if user is not None:
+        invalidate_user(user.pk)
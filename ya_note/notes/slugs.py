@@ -0,0 +1,73 @@
+import re
+from functools import lru_cache, reduce
+from operator import or_
+
+from django.db.models import Q
+from pytils.translit import slugify
+
+DEFAULT_SLUG = 'note'
+# Место под суффикс вида «-99999» у длинных адресов.
+SUFFIX_RESERVE = 6
+
+
+@lru_cache(maxsize=4096)
+def transliterate(title):
+    """Транслитерация заголовка; частые заголовки считаются один раз."""
+    return slugify(title)
+
+
+def candidates(base, max_length):
+    """
+    Условие на адреса, которые может занять base: сам base и base-N.
+
+    У длинного адреса суффикс вытесняет конец, поэтому основа берётся
+    для каждой длины суффикса. Диапазон [основа-, основа.) идёт по
+    уникальному индексу slug, регулярное выражение отсекает адреса
+    вида основа-текст.
+    """
+    condition = Q(slug=base)
+    for stem in {
+        base[:max_length - length] for length in range(2, SUFFIX_RESERVE + 1)
+    }:
+        condition |= Q(
+            slug__gte=f'{stem}-',
+            slug__lt=f'{stem}.',
+            slug__regex=rf'^{re.escape(stem)}-\d+$',
+        )
+    return condition
+
+
+def allocate_slugs(titles, queryset, reserved=()):
+    """
+    Свободные адреса для пачки заголовков.
+
+    Занятые адреса вида base и base-N выбираются одним запросом,
+    дальше к занятому адресу подбирается первый свободный суффикс:
+    slug, slug-2, slug-3... Повторы внутри пачки и адреса из reserved,
+    которые ещё не записаны в базу, тоже считаются занятыми.
+    """
+    max_length = queryset.model._meta.get_field('slug').max_length
+    bases = [
+        transliterate(title)[:max_length] or DEFAULT_SLUG for title in titles
+    ]
+    taken = set(
+        queryset.filter(
+            reduce(or_, (candidates(base, max_length) for base in set(bases)))
+        ).values_list('slug', flat=True)
+    ) if bases else set()
+    taken.update(reserved)
+    slugs = []
+    for base in bases:
+        slug = base
+        number = 1
+        while slug in taken:
+            number += 1
+            suffix = f'-{number}'
+            slug = base[:max_length - len(suffix)] + suffix
+        taken.add(slug)
+        slugs.append(slug)
+    return slugs
+
+
+def allocate_slug(title, queryset):
+    return allocate_slugs([title], queryset)[0]
@@ -0,0 +1,96 @@
+"""
+Синхронизация заметок по номерам изменений.
+
+Каждая запись заметки и каждый след удаления получают номер из
+SyncCounter в транзакции записи, поэтому номера становятся видны
+строго по возрастанию. Клиент хранит токен — последний номер,
+который он видел, — и получает только заметки и следы с большим
+номером. Обе выборки идут по индексам (author, change), так что их
+цена зависит от числа изменений, а не от числа заметок автора.
+
+Следы удалений хранятся NOTES_TOMBSTONE_RETENTION секунд. Клиент с
+токеном старше удалённого следа получает все заметки заново с
+флагом reset и должен заменить ими свою копию.
+"""
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Max
+from django.utils import timezone
+
+from .fields import decompress
+from .models import Note, NoteTombstone, SyncCounter
+
+CHANGED_FIELDS = ('id', 'slug', 'title', 'text', 'updated_at')
+
+
+class InvalidToken(ValueError):
+    """Токен синхронизации не разобран."""
+
+
+def parse_token(token):
+    """Токен — неотрицательный номер изменения."""
+    if not token.isdigit():
+        raise InvalidToken(token)
+    return int(token)
+
+
+def prune_tombstones(author_ids):
+    """Удаляет следы старше срока хранения и сдвигает границу pruned."""
+    expired = NoteTombstone.objects.filter(
+        author_id__in=author_ids,
+        deleted_at__lt=timezone.now() - timedelta(
+            seconds=settings.NOTES_TOMBSTONE_RETENTION
+        ),
+    )
+    last = expired.aggregate(last=Max('change'))['last']
+    if last is None:
+        return
+    expired.delete()
+    SyncCounter.objects.filter(pk=1, pruned__lt=last).update(pruned=last)
+
+
+def delete_with_tombstones(notes):
+    """Удаляет заметки, оставляя по каждой след для синхронизации."""
+    notes = list(notes)
+    if not notes:
+        return
+    with transaction.atomic():
+        NoteTombstone.objects.bulk_create(
+            NoteTombstone(author_id=note.author_id, note_id=note.pk,
+                          slug=note.slug, change=change)
+            for note, change in zip(notes, SyncCounter.reserve(len(notes)))
+        )
+        Note.objects.filter(pk__in=[note.pk for note in notes]).delete()
+        prune_tombstones({note.author_id for note in notes})
+
+
+def get_changes(author, since=None):
+    """
+    Изменения заметок автора после номера since.
+
+    Токен читается до выборок и ограничивает их сверху: запись,
+    зафиксированная позже, получит больший номер и придёт при
+    следующей синхронизации ровно один раз.
+    """
+    token, pruned = SyncCounter.state()
+    reset = since is not None and since < pruned
+    notes = Note.objects.filter(author=author, change__lte=token)
+    tombstones = NoteTombstone.objects.filter(author=author, change__lte=token)
+    if since and not reset:
+        notes = notes.filter(change__gt=since)
+        tombstones = tombstones.filter(change__gt=since)
+    else:
+        tombstones = tombstones.none()
+    changed = list(notes.order_by('change').values(*CHANGED_FIELDS))
+    for note in changed:
+        note['text'] = decompress(note['text'])
+    return {
+        'changed': changed,
+        'deleted': list(
+            tombstones.order_by('change').values('note_id', 'slug')
+        ),
+        'token': str(token),
+        'reset': reset,
+    }
@@ -1,9 +1,12 @@
 from django.contrib.auth import get_user_model
-from django.test import Client, TestCase
+from django.core.cache import cache
+from django.db import connection
+from django.test import Client, TestCase, override_settings
 from django.urls import reverse
 
 from notes.forms import NoteForm
 from notes.models import Note
+from notes.transfer import import_notes
 
 User = get_user_model()
 
@@ -11,8 +14,10 @@ SLUG = 'slug'
 URL_NOTES_ADD = reverse('notes:add')
 URL_NOTES_EDIT = reverse('notes:edit', args=(SLUG,))
 URL_NOTES_LIST = reverse('notes:list')
+URL_NOTES_SEARCH = reverse('notes:search')
 
 NOTES_COUNT = 10
+NOTES_PER_PAGE = 4
 
 
 class TestContent(TestCase):
@@ -34,6 +39,9 @@ class TestContent(TestCase):
             author=cls.author,
         )
 
+    def setUp(self):
+        cache.clear()
+
     def test_notes_count(self):
         response = self.auth_client.get(URL_NOTES_LIST)
         object_list = response.context['object_list']
@@ -55,3 +63,72 @@ class TestContent(TestCase):
         self.assertEqual(note.title, self.note.title)
         self.assertEqual(note.slug, self.note.slug)
         self.assertEqual(note.author, self.note.author)
+
+    def test_list_served_from_cache(self):
+        self.auth_client.get(URL_NOTES_LIST)
+        # Сессия и пользователь тоже берутся из кэша.
+        with self.assertNumQueries(0):
+            self.auth_client.get(URL_NOTES_LIST)
+
+    @override_settings(NOTES_COUNT_ON_PAGE=NOTES_PER_PAGE)
+    def test_list_pages_cover_all_notes(self):
+        context = self.auth_client.get(URL_NOTES_LIST).context
+        notes = list(context['object_list'])
+        while context['next_cursor']:
+            context = self.auth_client.get(
+                URL_NOTES_LIST, {'after': context['next_cursor']}
+            ).context
+            self.assertLessEqual(len(context['object_list']), NOTES_PER_PAGE)
+            notes += context['object_list']
+        self.assertEqual(notes, list(Note.objects.order_by('id')))
+        self.assertIn('text', notes[0].get_deferred_fields())
+
+
+class TestSearch(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create(username='Тестовый автор')
+        cls.reader = User.objects.create(username='Тестовый читатель')
+        cls.auth_client = Client()
+        cls.auth_client.force_login(cls.author)
+        cls.found = Note.objects.create(
+            title='Покупки', text='Купить молоко и хлеб', author=cls.author
+        )
+        Note.objects.create(
+            title='Планы', text='Сходить в кино', author=cls.author
+        )
+        Note.objects.create(
+            title='Чужие покупки', text='Молоко', author=cls.reader
+        )
+
+    def test_search_finds_only_own_notes(self):
+        response = self.auth_client.get(URL_NOTES_SEARCH, {'q': 'молок'})
+        self.assertEqual(list(response.context['object_list']), [self.found])
+
+    def test_search_follows_note_changes(self):
+        self.found.text = 'Купить кефир'
+        self.found.save()
+        response = self.auth_client.get(URL_NOTES_SEARCH, {'q': 'молоко'})
+        self.assertEqual(list(response.context['object_list']), [])
+        response = self.auth_client.get(URL_NOTES_SEARCH, {'q': 'кефир "'})
+        self.assertEqual(list(response.context['object_list']), [self.found])
+
+    def test_search_follows_import_and_deletion(self):
+        import_notes([{'title': 'Рецепт', 'text': 'Творог и изюм'}],
+                     self.author)
+        response = self.auth_client.get(URL_NOTES_SEARCH, {'q': 'изюм'})
+        imported = Note.objects.get(title='Рецепт')
+        self.assertEqual(list(response.context['object_list']), [imported])
+        imported.delete()
+        response = self.auth_client.get(URL_NOTES_SEARCH, {'q': 'изюм'})
+        self.assertEqual(list(response.context['object_list']), [])
+
+    def test_index_needs_no_triggers_and_keeps_no_text(self):
+        with connection.cursor() as cursor:
+            cursor.execute(
+                "SELECT name FROM sqlite_master WHERE type = 'trigger' "
+                "AND tbl_name = 'notes_note'"
+            )
+            self.assertEqual(cursor.fetchall(), [])
+            cursor.execute('SELECT title, text FROM notes_note_fts')
+            self.assertEqual(set(cursor.fetchall()), {(None, None)})
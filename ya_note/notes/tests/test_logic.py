@@ -1,12 +1,34 @@
+import io
+import json
+import sqlite3
+import tempfile
+import time
+from datetime import timedelta
+from pathlib import Path
+
+from django.conf import settings
 from django.contrib.auth import get_user_model
-from django.test import Client, TestCase
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.db import OperationalError, connection, connections
+from django.db.utils import load_backend
+from django.test import (
+    Client, TestCase, TransactionTestCase, override_settings
+)
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
 
 from http import HTTPStatus
 from pytils.translit import slugify
 
+from notes.autosave import draft_lock, get_draft
 from notes.forms import WARNING
-from notes.models import Note
+from notes.models import Note, NoteTombstone
+from notes.revisions import get_revision
+from notes.slugs import allocate_slugs
+from notes.transfer import import_notes
+from yanote.routers import read_only
 
 User = get_user_model()
 
@@ -15,6 +37,15 @@ URL_NOTES_ADD = reverse('notes:add')
 URL_NOTES_EDIT = reverse('notes:edit', args=(SLUG,))
 URL_NOTES_DELETE = reverse('notes:delete', args=(SLUG,))
 URL_NOTES_SUCCESS = reverse('notes:success')
+URL_USERS_LOGOUT = reverse('users:logout')
+URL_NOTES_IMPORT = reverse('notes:import')
+URL_NOTES_EXPORT = reverse('notes:export')
+URL_NOTES_LIST = reverse('notes:list')
+URL_API_BATCH = reverse('notes:api_batch')
+URL_API_CHANGES = reverse('notes:api_changes')
+URL_API_AUTOSAVE = reverse('notes:api_autosave', args=(SLUG,))
+URL_NOTES_SEARCH = reverse('notes:search')
+URL_NOTES_REVISIONS = reverse('notes:revisions', args=(SLUG,))
 
 
 class TestNoteCreation(TestCase):
@@ -63,6 +94,28 @@ class TestNoteCreation(TestCase):
         self.assertEqual(note.slug, self.form_data['slug'])
         self.assertEqual(note.author, self.another_author)
 
+    def test_new_note_replaces_cached_list(self):
+        cache.clear()
+        self.auth_client.get(URL_NOTES_LIST)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.auth_client.post(URL_NOTES_ADD, data=self.form_data)
+        response = self.auth_client.get(URL_NOTES_LIST)
+        self.assertContains(
+            response, reverse('notes:detail', args=(self.form_data['slug'],))
+        )
+
+    def test_writes_outside_views_replace_cached_list(self):
+        cache.clear()
+        self.auth_client.get(URL_NOTES_LIST)
+        import_notes([{'title': 'Загрузка', 'text': 'Текст'}], self.author)
+        url = reverse('notes:detail', args=('zagruzka',))
+        response = self.auth_client.get(URL_NOTES_LIST)
+        self.assertContains(response, url)
+        with self.captureOnCommitCallbacks(execute=True):
+            Note.objects.get(slug='zagruzka').delete()
+        response = self.auth_client.get(URL_NOTES_LIST)
+        self.assertNotContains(response, url)
+
     def test_not_unique_slug(self):
         initial_notes = set(Note.objects.all())
         self.form_data['slug'] = self.note.slug
@@ -90,6 +143,33 @@ class TestNoteCreation(TestCase):
         self.assertEqual(note.slug, expected_slug)
         self.assertEqual(note.author, self.author)
 
+    def test_empty_slug_gets_free_suffix(self):
+        Note.objects.create(
+            title=self.NOTE_TITLE,
+            text=self.NOTE_TEXT,
+            author=self.author,
+        )
+        response = self.auth_client.post(
+            URL_NOTES_ADD,
+            data=self.form_data_no_slug)
+        self.assertRedirects(response, URL_NOTES_SUCCESS)
+        expected_slug = slugify(self.NOTE_TITLE) + '-2'
+        self.assertTrue(Note.objects.filter(slug=expected_slug).exists())
+
+    def test_slug_lookup_ignores_unrelated_prefixes(self):
+        base = slugify(self.NOTE_TITLE)
+        for slug in (base, f'{base}-2', f'{base}-plan', f'{base}2'):
+            Note.objects.create(
+                title=self.NOTE_TITLE, text=self.NOTE_TEXT, slug=slug,
+                author=self.author,
+            )
+        with CaptureQueriesContext(connection) as context:
+            slugs = allocate_slugs(
+                [self.NOTE_TITLE, self.NOTE_TITLE], Note.objects.all()
+            )
+        self.assertEqual(slugs, [f'{base}-3', f'{base}-4'])
+        self.assertEqual(len(context.captured_queries), 1)
+
 
 class TestEditAndDeleteNote(TestCase):
     NOTE_TEXT = 'Текст заметки'
@@ -139,6 +219,17 @@ class TestEditAndDeleteNote(TestCase):
         self.assertEqual(note_from_db.slug, self.form_data['slug'])
         self.assertEqual(note_from_db.author, self.note.author)
 
+    def test_cleared_slug_keeps_own_address(self):
+        note = Note.objects.create(
+            title=self.NOTE_TITLE, text=self.NOTE_TEXT, author=self.author
+        )
+        response = self.author_client.post(
+            reverse('notes:edit', args=(note.slug,)),
+            data={'title': self.NOTE_TITLE, 'text': self.NOTE_TEXT}
+        )
+        self.assertRedirects(response, URL_NOTES_SUCCESS)
+        self.assertEqual(Note.objects.get(pk=note.pk).slug, note.slug)
+
     def test_reader_cant_edit_user_note(self):
         response = self.reader_client.post(URL_NOTES_EDIT, data=self.form_data)
         self.assertEqual(response.status_code, HTTPStatus.NOT_FOUND)
@@ -147,3 +238,623 @@ class TestEditAndDeleteNote(TestCase):
         self.assertEqual(note_from_db.title, self.note.title)
         self.assertEqual(note_from_db.slug, self.note.slug)
         self.assertEqual(note_from_db.author, self.note.author)
+
+
+class TestNoteTransfer(TestCase):
+    RECORDS = (
+        {'title': 'Заголовок', 'text': 'Первый текст'},
+        {'title': 'Заголовок', 'text': 'Второй текст'},
+        {'title': 'Другой', 'text': 'Третий текст', 'slug': 'drugoi'},
+    )
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create(username='Тестовый автор')
+        cls.auth_client = Client()
+        cls.auth_client.force_login(cls.author)
+
+    def upload(self, content, fmt):
+        return self.auth_client.post(URL_NOTES_IMPORT, data={
+            'file': SimpleUploadedFile(f'notes.{fmt}', content.encode()),
+            'format': fmt,
+        })
+
+    def test_import_and_export_jsonl(self):
+        content = ''.join(
+            json.dumps(record, ensure_ascii=False) + '\n'
+            for record in self.RECORDS
+        )
+        response = self.upload(content, 'jsonl')
+        self.assertRedirects(response, URL_NOTES_SUCCESS)
+        self.assertEqual(
+            set(Note.objects.values_list('slug', flat=True)),
+            {'zagolovok', 'zagolovok-2', 'drugoi'}
+        )
+        response = self.auth_client.get(URL_NOTES_EXPORT)
+        exported = [
+            json.loads(line)
+            for line in b''.join(response.streaming_content).splitlines()
+        ]
+        self.assertEqual(
+            [record['text'] for record in exported],
+            [record['text'] for record in self.RECORDS]
+        )
+
+    def test_import_csv(self):
+        response = self.upload('title,text\nЗаметка,Текст\n', 'csv')
+        self.assertRedirects(response, URL_NOTES_SUCCESS)
+        note = Note.objects.get()
+        self.assertEqual(note.text, 'Текст')
+        self.assertEqual(note.author, self.author)
+
+    def test_import_rejects_broken_line(self):
+        response = self.upload('{"title": "Заметка"', 'jsonl')
+        self.assertFormError(
+            response, form='form', field='file',
+            errors='Строка 1: некорректный JSON.'
+        )
+        self.assertFalse(Note.objects.exists())
+
+    def test_import_rejects_invalid_encoding(self):
+        response = self.auth_client.post(URL_NOTES_IMPORT, data={
+            'file': SimpleUploadedFile(
+                'notes.csv', 'title,text\nЗаметка,Текст\n'.encode('cp1251')
+            ),
+            'format': 'csv',
+        })
+        self.assertFormError(
+            response, form='form', field='file',
+            errors='Файл должен быть в кодировке UTF-8.'
+        )
+
+    @override_settings(NOTES_IMPORT_BATCH_SIZE=1)
+    def test_import_error_reports_imported_count(self):
+        response = self.upload(
+            '{"title": "Первая", "text": "Текст"}\n{"title"', 'jsonl'
+        )
+        self.assertFormError(
+            response, form='form', field='file', errors=[
+                'Строка 2: некорректный JSON.',
+                'Импортировано заметок до ошибки: 1.',
+            ]
+        )
+        self.assertEqual(Note.objects.count(), 1)
+
+
+class TestNoteBatchApi(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create(username='Тестовый автор')
+        cls.reader = User.objects.create(username='Тестовый читатель')
+        cls.auth_client = Client()
+        cls.auth_client.force_login(cls.author)
+        cls.note = Note.objects.create(
+            title='Заголовок', text='Текст', slug=SLUG, author=cls.author
+        )
+        cls.other_note = Note.objects.create(
+            title='Чужая', text='Текст', slug='other', author=cls.reader
+        )
+
+    def post_batch(self, operations):
+        return self.auth_client.post(
+            URL_API_BATCH,
+            data=json.dumps({'operations': operations}),
+            content_type='application/json',
+        )
+
+    def test_batch_is_applied(self):
+        response = self.post_batch([
+            {'op': 'create', 'title': 'Новая', 'text': 'Текст'},
+            {'op': 'update', 'note': SLUG, 'text': 'Новый текст'},
+            {'op': 'create', 'title': 'Вторая', 'text': 'Текст', 'slug': 's2'},
+        ])
+        self.assertEqual(response.status_code, HTTPStatus.OK)
+        self.assertEqual(
+            [result['slug'] for result in response.json()['results']],
+            ['novaya', SLUG, 's2']
+        )
+        self.note.refresh_from_db()
+        self.assertEqual(self.note.text, 'Новый текст')
+        self.assertEqual(self.note.title, 'Заголовок')
+        self.assertEqual(
+            Note.objects.filter(author=self.author).count(), 3
+        )
+
+    def test_cleared_slug_is_kept_in_batch(self):
+        response = self.post_batch([
+            {'op': 'update', 'note': SLUG, 'title': 'Заголовок', 'slug': ''},
+        ])
+        self.assertEqual(response.status_code, HTTPStatus.OK)
+        self.assertEqual(response.json()['results'][0]['slug'], 'zagolovok')
+        response = self.post_batch([
+            {'op': 'update', 'note': 'zagolovok', 'slug': ''},
+        ])
+        self.assertEqual(response.json()['results'][0]['slug'], 'zagolovok')
+
+    def test_invalid_batch_changes_nothing(self):
+        response = self.post_batch([
+            {'op': 'delete', 'note': SLUG},
+            {'op': 'create', 'title': 'Новая', 'text': 'Текст',
+             'slug': 'other'},
+            {'op': 'delete', 'note': 'other'},
+        ])
+        self.assertEqual(response.status_code, HTTPStatus.BAD_REQUEST)
+        self.assertEqual(set(response.json()['errors']), {'1', '2'})
+        self.assertTrue(Note.objects.filter(pk=self.note.pk).exists())
+        self.assertTrue(Note.objects.filter(pk=self.other_note.pk).exists())
+
+    def test_unhashable_note_is_rejected(self):
+        for note in ([SLUG], {'slug': SLUG}):
+            with self.subTest(note=note):
+                response = self.post_batch([{'op': 'delete', 'note': note}])
+                self.assertEqual(
+                    response.status_code, HTTPStatus.BAD_REQUEST
+                )
+        self.assertTrue(Note.objects.filter(pk=self.note.pk).exists())
+
+    def test_anonymous_user_is_forbidden(self):
+        response = self.client.post(
+            URL_API_BATCH, data='{}', content_type='application/json'
+        )
+        self.assertEqual(response.status_code, HTTPStatus.FORBIDDEN)
+
+
+class TestNoteChangesApi(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create(username='Тестовый автор')
+        cls.reader = User.objects.create(username='Тестовый читатель')
+        cls.auth_client = Client()
+        cls.auth_client.force_login(cls.author)
+        cls.note = Note.objects.create(
+            title='Заголовок', text='Текст', slug=SLUG, author=cls.author
+        )
+        cls.kept_note = Note.objects.create(
+            title='Старая', text='Текст', slug='kept', author=cls.author
+        )
+        Note.objects.create(
+            title='Чужая', text='Текст', slug='other', author=cls.reader
+        )
+
+    def test_first_sync_returns_all_notes(self):
+        response = self.auth_client.get(URL_API_CHANGES)
+        self.assertEqual(response.status_code, HTTPStatus.OK)
+        self.assertEqual(
+            {note['slug'] for note in response.json()['changed']},
+            {SLUG, 'kept'}
+        )
+        self.assertEqual(response.json()['deleted'], [])
+
+    def test_sync_returns_only_changes(self):
+        token = self.auth_client.get(URL_API_CHANGES).json()['token']
+        self.auth_client.post(URL_NOTES_EDIT, data={
+            'title': 'Заголовок', 'text': 'Новый текст', 'slug': SLUG
+        })
+        self.auth_client.post(
+            URL_NOTES_DELETE.replace(SLUG, 'kept')
+        )
+        with self.assertNumQueries(3):
+            response = self.auth_client.get(
+                URL_API_CHANGES, {'since': token}
+            )
+        changes = response.json()
+        self.assertEqual(
+            [note['text'] for note in changes['changed']], ['Новый текст']
+        )
+        self.assertEqual(
+            changes['deleted'],
+            [{'note_id': self.kept_note.pk, 'slug': 'kept'}]
+        )
+        response = self.auth_client.get(
+            URL_API_CHANGES, {'since': changes['token']}
+        )
+        self.assertEqual(response.json()['changed'], [])
+        self.assertEqual(response.json()['deleted'], [])
+
+    def test_invalid_token(self):
+        response = self.auth_client.get(URL_API_CHANGES, {'since': 'вчера'})
+        self.assertEqual(response.status_code, HTTPStatus.BAD_REQUEST)
+
+    def test_late_commit_is_not_skipped(self):
+        token = self.auth_client.get(URL_API_CHANGES).json()['token']
+        self.note.updated_at = self.note.updated_at - timedelta(hours=1)
+        self.note.text = 'Записано задним числом'
+        self.note.save(update_fields=('text',))
+        response = self.auth_client.get(URL_API_CHANGES, {'since': token})
+        self.assertEqual(
+            [note['slug'] for note in response.json()['changed']], [SLUG]
+        )
+
+    @override_settings(NOTES_TOMBSTONE_RETENTION=0)
+    def test_expired_tombstones_force_reset(self):
+        token = self.auth_client.get(URL_API_CHANGES).json()['token']
+        self.auth_client.post(URL_NOTES_DELETE.replace(SLUG, 'kept'))
+        self.auth_client.post(URL_NOTES_DELETE)
+        self.assertFalse(NoteTombstone.objects.filter(slug='kept').exists())
+        changes = self.auth_client.get(
+            URL_API_CHANGES, {'since': token}
+        ).json()
+        self.assertTrue(changes['reset'])
+        self.assertEqual(changes['changed'], [])
+        self.assertEqual(changes['deleted'], [])
+
+
+class TestNoteAutosave(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create(username='Тестовый автор')
+        cls.reader = User.objects.create(username='Тестовый читатель')
+        cls.note = Note.objects.create(
+            title='Заголовок', text='Текст', slug=SLUG, author=cls.author
+        )
+
+    def setUp(self):
+        cache.clear()
+        self.auth_client = Client()
+        self.auth_client.force_login(self.author)
+
+    def test_edits_are_coalesced(self):
+        for number in range(5):
+            response = self.auth_client.post(
+                URL_API_AUTOSAVE, {'text': f'Правка {number}'}
+            )
+            self.assertEqual(response.json()['saved'], number == 0)
+        self.note.refresh_from_db()
+        self.assertEqual(self.note.text, 'Правка 0')
+        response = self.auth_client.get(URL_NOTES_EDIT)
+        self.assertEqual(response.context['form']['text'].value(), 'Правка 4')
+        response = self.auth_client.post(URL_API_AUTOSAVE, {'flush': '1'})
+        self.assertTrue(response.json()['saved'])
+        self.note.refresh_from_db()
+        self.assertEqual(self.note.text, 'Правка 4')
+        self.assertEqual(self.note.title, 'Заголовок')
+
+    def test_form_save_discards_draft(self):
+        self.auth_client.post(URL_API_AUTOSAVE, {'text': 'Первая'})
+        self.auth_client.post(URL_API_AUTOSAVE, {'text': 'Черновик'})
+        self.auth_client.post(URL_NOTES_EDIT, data={
+            'title': 'Заголовок', 'text': 'Из формы', 'slug': SLUG
+        })
+        response = self.auth_client.get(URL_NOTES_EDIT)
+        self.assertEqual(response.context['form']['text'].value(), 'Из формы')
+
+    def test_invalid_edit_is_rejected(self):
+        response = self.auth_client.post(URL_API_AUTOSAVE, {'title': ''})
+        self.assertEqual(response.status_code, HTTPStatus.BAD_REQUEST)
+
+    def test_reader_cant_autosave_user_note(self):
+        reader_client = Client()
+        reader_client.force_login(self.reader)
+        response = reader_client.post(URL_API_AUTOSAVE, {'text': 'Чужое'})
+        self.assertEqual(response.status_code, HTTPStatus.NOT_FOUND)
+
+    def test_locked_draft_is_not_overwritten(self):
+        with draft_lock(self.note.pk):
+            with override_settings(NOTES_AUTOSAVE_LOCK_TIMEOUT=0):
+                response = self.auth_client.post(
+                    URL_API_AUTOSAVE, {'text': 'Параллельная правка'}
+                )
+        self.assertEqual(response.status_code, HTTPStatus.CONFLICT)
+
+
+@override_settings(NOTES_AUTOSAVE_INTERVAL=0.05)
+class TestNoteAutosaveDeadline(TransactionTestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.author = User.objects.create(username='Тестовый автор')
+        self.note = Note.objects.create(
+            title='Заголовок', text='Текст', slug=SLUG, author=self.author
+        )
+        self.auth_client = Client()
+        self.auth_client.force_login(self.author)
+
+    def test_draft_tail_is_flushed_by_timer(self):
+        self.auth_client.post(URL_API_AUTOSAVE, {'text': 'Первая'})
+        response = self.auth_client.post(URL_API_AUTOSAVE, {'text': 'Хвост'})
+        self.assertFalse(response.json()['saved'])
+        deadline = time.monotonic() + 5
+        while get_draft(self.note) is not None:
+            self.assertLess(time.monotonic(), deadline)
+            time.sleep(0.01)
+        self.note.refresh_from_db()
+        self.assertEqual(self.note.text, 'Хвост')
+        self.assertIsNone(get_draft(self.note))
+
+
+@override_settings(
+    NOTES_TEXT_COMPRESSION=True, NOTES_TEXT_COMPRESSION_THRESHOLD=100
+)
+class TestTextCompression(TestCase):
+    LONG_TEXT = 'Купить молоко и хлеб. ' * 50
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create(username='Тестовый автор')
+        cls.auth_client = Client()
+        cls.auth_client.force_login(cls.author)
+
+    def stored_type(self, note):
+        with connection.cursor() as cursor:
+            cursor.execute(
+                'SELECT typeof(text) FROM notes_note WHERE id = %s',
+                [note.pk]
+            )
+            return cursor.fetchone()[0]
+
+    def test_long_text_is_stored_compressed(self):
+        note = Note.objects.create(
+            title='Длинная', text=self.LONG_TEXT, slug=SLUG, author=self.author
+        )
+        short = Note.objects.create(
+            title='Короткая', text='Текст', slug='short', author=self.author
+        )
+        self.assertEqual(self.stored_type(note), 'blob')
+        self.assertEqual(self.stored_type(short), 'text')
+        self.assertEqual(Note.objects.get(pk=note.pk).text, self.LONG_TEXT)
+        response = self.auth_client.get(URL_NOTES_EDIT)
+        self.assertEqual(
+            response.context['form']['text'].value(), self.LONG_TEXT
+        )
+        response = self.auth_client.get(URL_NOTES_SEARCH, {'q': 'хлеб'})
+        self.assertEqual(list(response.context['object_list']), [note])
+        response = self.auth_client.get(URL_NOTES_EXPORT)
+        self.assertIn(
+            self.LONG_TEXT, b''.join(response.streaming_content).decode()
+        )
+
+    def test_command_compresses_existing_notes(self):
+        with override_settings(NOTES_TEXT_COMPRESSION=False):
+            note = Note.objects.create(
+                title='Длинная', text=self.LONG_TEXT, author=self.author
+            )
+        self.assertEqual(self.stored_type(note), 'text')
+        call_command('compress_notes', batch_size=1, stdout=io.StringIO())
+        self.assertEqual(self.stored_type(note), 'blob')
+        call_command(
+            'compress_notes', decompress=True, stdout=io.StringIO()
+        )
+        self.assertEqual(self.stored_type(note), 'text')
+        note.refresh_from_db()
+        self.assertEqual(note.text, self.LONG_TEXT)
+
+
+@override_settings(NOTES_REVISION_SNAPSHOT_EVERY=5)
+class TestNoteRevisions(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create(username='Тестовый автор')
+        cls.reader = User.objects.create(username='Тестовый читатель')
+        cls.note = Note.objects.create(
+            title='Заголовок', text='Строка 0', slug=SLUG, author=cls.author
+        )
+
+    def setUp(self):
+        self.auth_client = Client()
+        self.auth_client.force_login(self.author)
+
+    def edit(self, number):
+        text = '\n'.join(f'Строка {line}' for line in range(number + 1))
+        self.auth_client.post(URL_NOTES_EDIT, data={
+            'title': f'Заголовок {number}', 'text': text, 'slug': SLUG
+        })
+        return text
+
+    def test_revisions_are_deltas_with_snapshots(self):
+        texts = ['Строка 0'] + [self.edit(number) for number in range(1, 12)]
+        revisions = self.note.revisions.all()
+        self.assertEqual(len(revisions), 12)
+        self.assertEqual(
+            [revision.number for revision in revisions
+             if revision.is_snapshot],
+            [11, 6, 1]
+        )
+        for number, text in enumerate(texts, 1):
+            with self.subTest(number=number), self.assertNumQueries(1):
+                self.assertEqual(get_revision(self.note, number)[1], text)
+        response = self.auth_client.get(URL_NOTES_REVISIONS)
+        self.assertEqual(len(response.context['revisions']), 12)
+
+    def test_author_can_restore_revision(self):
+        self.edit(1)
+        response = self.auth_client.post(
+            reverse('notes:restore', args=(SLUG, 1))
+        )
+        self.assertRedirects(response, URL_NOTES_SUCCESS)
+        self.note.refresh_from_db()
+        self.assertEqual(self.note.text, 'Строка 0')
+        self.assertEqual(self.note.title, 'Заголовок')
+        self.assertEqual(self.note.revisions.count(), 3)
+
+    def test_reader_cant_restore_user_note(self):
+        self.edit(1)
+        reader_client = Client()
+        reader_client.force_login(self.reader)
+        response = reader_client.post(reverse('notes:restore', args=(SLUG, 1)))
+        self.assertEqual(response.status_code, HTTPStatus.NOT_FOUND)
+        self.note.refresh_from_db()
+        self.assertEqual(self.note.title, 'Заголовок 1')
+
+
+class TestDatabaseRouting(TestCase):
+
+    def test_connection_pragmas_follow_settings(self):
+        with connection.cursor() as cursor:
+            cursor.execute('PRAGMA busy_timeout')
+            self.assertEqual(
+                cursor.fetchone()[0], settings.SQLITE_BUSY_TIMEOUT
+            )
+
+    def test_read_only_views_read_from_replica(self):
+        with read_only():
+            self.assertEqual(Note.objects.all().db, 'default')
+        settings_dict = connections['readonly'].settings_dict
+        name = settings_dict['NAME']
+        settings_dict['NAME'] = 'file:other?mode=ro'
+        try:
+            with read_only():
+                self.assertEqual(Note.objects.all().db, 'readonly')
+            self.assertEqual(Note.objects.all().db, 'default')
+        finally:
+            settings_dict['NAME'] = name
+
+    def test_read_only_connection_reads_file_and_rejects_writes(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        path = Path(directory.name) / 'replica.sqlite3'
+        source = sqlite3.connect(path)
+        with source:
+            source.execute('CREATE TABLE item (name TEXT)')
+            source.execute("INSERT INTO item VALUES ('строка')")
+        source.close()
+        replica = load_backend('yanote.sqlite3').DatabaseWrapper({
+            **connections['readonly'].settings_dict,
+            'NAME': path.as_uri() + '?mode=ro',
+        }, alias='replica')
+        self.addCleanup(replica.close)
+        with replica.cursor() as cursor:
+            cursor.execute('SELECT name FROM item')
+            self.assertEqual(cursor.fetchall(), [('строка',)])
+            cursor.execute('PRAGMA query_only')
+            self.assertEqual(cursor.fetchone()[0], 1)
+            with self.assertRaises(OperationalError):
+                cursor.execute("INSERT INTO item VALUES ('запись')")
+
+
+class TestCachedAuth(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create(username='Тестовый автор')
+
+    def setUp(self):
+        self.auth_client = Client()
+        self.auth_client.force_login(self.author)
+
+    def test_user_is_served_from_cache(self):
+        self.auth_client.get(URL_NOTES_SUCCESS)
+        with self.assertNumQueries(0):
+            response = self.auth_client.get(URL_NOTES_SUCCESS)
+        self.assertEqual(response.wsgi_request.user, self.author)
+
+    def test_user_update_refreshes_cache(self):
+        self.auth_client.get(URL_NOTES_SUCCESS)
+        self.author.username = 'Новое имя'
+        self.author.save()
+        response = self.auth_client.get(URL_NOTES_SUCCESS)
+        self.assertEqual(response.wsgi_request.user.username, 'Новое имя')
+
+    def test_password_change_logs_out_other_sessions(self):
+        self.auth_client.get(URL_NOTES_SUCCESS)
+        self.author.set_password('новый-пароль')
+        self.author.save()
+        response = self.auth_client.get(URL_NOTES_SUCCESS)
+        self.assertFalse(response.wsgi_request.user.is_authenticated)
+
+    def test_logout_ends_cached_session(self):
+        self.auth_client.get(URL_NOTES_SUCCESS)
+        session_cookie = self.auth_client.cookies['sessionid'].value
+        self.auth_client.get(URL_USERS_LOGOUT)
+        other_client = Client()
+        other_client.cookies['sessionid'] = session_cookie
+        response = other_client.get(URL_NOTES_SUCCESS)
+        self.assertFalse(response.wsgi_request.user.is_authenticated)
+
+
+class TestSamplingProfiler(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create(username='Тестовый автор')
+        Note.objects.bulk_create(
+            Note(title=f'Заметка {index}', text='Текст', slug=f'slug{index}',
+                 author=cls.author)
+            for index in range(50)
+        )
+
+    def setUp(self):
+        cache.clear()
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.profile_dir = Path(directory.name)
+
+    def test_authorized_request_is_profiled(self):
+        with override_settings(
+            PROFILER_TOKEN='secret',
+            PROFILER_DIR=self.profile_dir,
+            PROFILER_INTERVAL=0.0001,
+        ):
+            auth_client = Client()
+            auth_client.force_login(self.author)
+            auth_client.get(URL_NOTES_LIST)
+            self.assertFalse(any(self.profile_dir.iterdir()))
+            cache.clear()
+            auth_client.get(URL_NOTES_LIST, HTTP_X_PROFILE='secret')
+            self.assertEqual(
+                len(list((self.profile_dir / 'notes.list').iterdir())), 1
+            )
+            (self.profile_dir / 'notes.list' / '0-1.folded').write_text(
+                'a:main;django.template.base:render 2\n'
+            )
+            output = self.profile_dir / 'merged.folded'
+            call_command(
+                'merge_profiles', url_name='notes:list', output=output,
+                stderr=io.StringIO(),
+            )
+            self.assertIn('[template]', output.read_text())
+
+
+class TestSlowQueryLog(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create(username='Тестовый автор')
+        cls.note = Note.objects.create(
+            title='Заголовок', text='Текст', slug=SLUG, author=cls.author
+        )
+
+    def setUp(self):
+        cache.clear()
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.log = Path(directory.name) / 'slow.jsonl'
+
+    def test_slow_queries_are_logged_with_plan(self):
+        auth_client = Client()
+        auth_client.force_login(self.author)
+        with override_settings(
+            SLOW_QUERY_THRESHOLD=0, SLOW_QUERY_LOG=self.log
+        ):
+            auth_client.get(URL_NOTES_LIST)
+        records = [
+            json.loads(line) for line in self.log.read_text().splitlines()
+        ]
+        notes_query = next(
+            record for record in records
+            if 'FROM "notes_note"' in record['sql']
+        )
+        self.assertEqual(notes_query['url_name'], 'notes:list')
+        self.assertTrue(notes_query['plan'])
+
+    def test_analyzer_suggests_index(self):
+        record = {
+            'time': 0,
+            'url_name': 'notes:list',
+            'sql': 'SELECT "notes_note"."id" FROM "notes_note" '
+                   'WHERE "notes_note"."title" = %s',
+            'duration_ms': 50,
+            'plan': ['SCAN notes_note'],
+        }
+        self.log.write_text(json.dumps(record) + '\n')
+        output = io.StringIO()
+        with override_settings(SLOW_QUERY_LOG=self.log):
+            call_command('analyze_slow_queries', stdout=output)
+        report = output.getvalue()
+        self.assertIn('полный просмотр notes_note', report)
+        self.assertIn(
+            "models.Index(fields=('title',)) в notes.Note", report
+        )
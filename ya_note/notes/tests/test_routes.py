@@ -1,7 +1,8 @@
 from http import HTTPStatus
 
 from django.contrib.auth import get_user_model
-from django.test import Client, TestCase
+from django.core.cache import cache
+from django.test import Client, TestCase, override_settings
 from django.urls import reverse
 
 from notes.models import Note
@@ -19,6 +20,7 @@ URL_NOTES_SUCCESS = reverse('notes:success')
 URL_USERS_LOGIN = reverse('users:login')
 URL_USERS_LOGOUT = reverse('users:logout')
 URL_USERS_SINGIN = reverse('users:signup')
+URL_METRICS = reverse('metrics')
 URL_REDIRECT_ADD = f'{URL_USERS_LOGIN}?next={URL_NOTES_ADD}'
 URL_REDIRECT_SUCCESS = f'{URL_USERS_LOGIN}?next={URL_NOTES_SUCCESS}'
 URL_REDIRECT_LIST = f'{URL_USERS_LOGIN}?next={URL_NOTES_LIST}'
@@ -39,6 +41,7 @@ class TestRoutes(TestCase):
             author=cls.author)
 
     def setUp(self):
+        cache.clear()
         self.client_author = Client()
         self.client_author.force_login(self.author)
         self.client_reader = Client()
@@ -85,3 +88,17 @@ class TestRoutes(TestCase):
             with self.subTest(url=url, user=user, redirect_url=redirect_url):
                 response = user.get(url)
                 self.assertRedirects(response, redirect_url)
+
+    @override_settings(METRICS_ENABLED=True)
+    def test_metrics_count_view_queries(self):
+        self.client_author.get(URL_NOTES_LIST)
+        response = self.client.get(URL_METRICS)
+        self.assertEqual(response.status_code, HTTPStatus.OK)
+        self.assertIn(
+            'view_db_queries_count{view="notes:list"} ',
+            response.content.decode()
+        )
+
+    def test_metrics_hidden_when_disabled(self):
+        response = self.client.get(URL_METRICS)
+        self.assertEqual(response.status_code, HTTPStatus.NOT_FOUND)
@@ -0,0 +1,151 @@
+"""
+Потоковый импорт и экспорт заметок.
+
+Записи читаются и пишутся по одной, вставка идёт пачками фиксированного
+размера, так что память не зависит от числа заметок в файле.
+"""
+import csv
+import io
+import json
+from itertools import islice
+
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.db import IntegrityError, transaction
+
+from .cache import bump_author_version
+from .fields import decompress
+from .models import SLUG_ATTEMPTS, Note, SyncCounter
+from .search import index_bulk_created
+from .slugs import allocate_slugs
+
+FORMATS = (
+    ('jsonl', 'JSON Lines'),
+    ('csv', 'CSV'),
+)
+FIELDS = ('title', 'text', 'slug')
+CONTENT_TYPES = {
+    'jsonl': 'application/x-ndjson; charset=utf-8',
+    'csv': 'text/csv; charset=utf-8',
+}
+
+
+def read_records(stream, fmt):
+    """
+    Словари полей заметок из двоичного потока.
+
+    Ошибки кодировки и разбора CSV превращаются в ValidationError,
+    чтобы форма показала их как обычную ошибку файла.
+    """
+    text = io.TextIOWrapper(stream, encoding='utf-8', newline='')
+    try:
+        if fmt == 'csv':
+            try:
+                yield from csv.DictReader(text)
+            except csv.Error as error:
+                raise ValidationError(f'Некорректный CSV: {error}.')
+            return
+        for number, line in enumerate(text, 1):
+            if not line.strip():
+                continue
+            try:
+                yield json.loads(line)
+            except ValueError:
+                raise ValidationError(f'Строка {number}: некорректный JSON.')
+    except UnicodeDecodeError:
+        raise ValidationError('Файл должен быть в кодировке UTF-8.')
+
+
+def build_note(number, record, author):
+    if not isinstance(record, dict):
+        raise ValidationError(f'Запись {number}: ожидался объект.')
+    note = Note(
+        author=author,
+        **{name: record[name] for name in FIELDS if record.get(name)}
+    )
+    try:
+        note.full_clean(exclude=('slug', 'author'), validate_unique=False)
+    except ValidationError as error:
+        raise ValidationError(f'Запись {number}: {"; ".join(error.messages)}')
+    return note
+
+
+def insert_chunk(chunk):
+    """
+    Вставляет пачку заметок одной транзакцией.
+
+    Адреса подбираются для всей пачки сразу; если параллельная запись
+    заняла один из них, пачка откатывается и адреса подбираются заново.
+    """
+    requested = [note.slug or note.title for note in chunk]
+    for attempt in range(1, SLUG_ATTEMPTS + 1):
+        slugs = allocate_slugs(requested, Note.objects.all())
+        for note, slug in zip(chunk, slugs):
+            note.slug = slug
+        try:
+            with transaction.atomic():
+                changes = SyncCounter.reserve(len(chunk))
+                for note, change in zip(chunk, changes):
+                    note.change = change
+                Note.objects.bulk_create(chunk)
+                index_bulk_created(chunk)
+            return
+        except IntegrityError:
+            if attempt == SLUG_ATTEMPTS:
+                raise
+
+
+def import_notes(records, author, batch_size=None):
+    """
+    Создаёт заметки автора из потока записей, возвращает их число.
+
+    Каждая пачка фиксируется отдельно, поэтому ошибка в середине файла
+    оставляет уже вставленные пачки; в тексте ошибки указан номер записи
+    и число заметок, импортированных до неё.
+    """
+    batch_size = batch_size or settings.NOTES_IMPORT_BATCH_SIZE
+    numbered = enumerate(records, 1)
+    created = 0
+    while True:
+        try:
+            chunk = [
+                build_note(number, record, author)
+                for number, record in islice(numbered, batch_size)
+            ]
+        except ValidationError as error:
+            if created:
+                error = ValidationError(
+                    error.messages
+                    + [f'Импортировано заметок до ошибки: {created}.']
+                )
+            raise error
+        if not chunk:
+            return created
+        insert_chunk(chunk)
+        bump_author_version(author.pk)
+        created += len(chunk)
+
+
+class Echo:
+    """Псевдо-файл для csv.writer: возвращает строку вместо записи."""
+
+    def write(self, value):
+        return value
+
+
+def export_notes(queryset, fmt):
+    """Строки файла экспорта; заметки читаются из базы кусками."""
+    rows = (
+        (title, decompress(text), slug)
+        for title, text, slug in queryset.order_by('pk').values_list(
+            *FIELDS
+        ).iterator(chunk_size=settings.NOTES_EXPORT_CHUNK_SIZE)
+    )
+    if fmt == 'csv':
+        writer = csv.writer(Echo())
+        yield writer.writerow(FIELDS)
+        for row in rows:
+            yield writer.writerow(row)
+        return
+    for row in rows:
+        yield json.dumps(dict(zip(FIELDS, row)), ensure_ascii=False) + '\n'
@@ -1,6 +1,6 @@
 from django.urls import path
 
-from notes import views
+from notes import api, views
 
 app_name = 'notes'
 
@@ -11,5 +11,27 @@ urlpatterns = [
     path('note/<slug:slug>/', views.NoteDetail.as_view(), name='detail'),
     path('delete/<slug:slug>/', views.NoteDelete.as_view(), name='delete'),
     path('notes/', views.NotesList.as_view(), name='list'),
+    path(
+        'revisions/<slug:slug>/',
+        views.NoteRevisions.as_view(),
+        name='revisions',
+    ),
+    path(
+        'revisions/<slug:slug>/<int:number>/restore/',
+        views.NoteRevisionRestore.as_view(),
+        name='restore',
+    ),
+    path('search/', views.NoteSearch.as_view(), name='search'),
+    path('import/', views.NoteImport.as_view(), name='import'),
+    path('export/', views.NoteExport.as_view(), name='export'),
+    path('api/notes/batch/', api.NoteBatchApi.as_view(), name='api_batch'),
+    path(
+        'api/notes/changes/', api.NoteChangesApi.as_view(), name='api_changes'
+    ),
+    path(
+        'api/notes/<slug:slug>/autosave/',
+        api.NoteAutosave.as_view(),
+        name='api_autosave',
+    ),
     path('done/', views.NoteSuccess.as_view(), name='success'),
 ]
@@ -1,9 +1,22 @@
+from functools import partial
+
+from django.conf import settings
 from django.contrib.auth.mixins import LoginRequiredMixin
+from django.core.exceptions import ValidationError
+from django.http import Http404, HttpResponseRedirect, StreamingHttpResponse
 from django.urls import reverse_lazy
 from django.views import generic
 
-from .forms import NoteForm
+from yanote.routers import ReadOnlyViewMixin
+
+from .autosave import discard_draft, get_draft
+from .cache import get_cached_page
+from .forms import NoteForm, NoteImportForm
 from .models import Note
+from .revisions import get_revision, record_revision
+from .search import search_notes
+from .sync import delete_with_tombstones
+from .transfer import CONTENT_TYPES, export_notes, import_notes, read_records
 
 
 class Home(generic.TemplateView):
@@ -26,6 +39,22 @@ class NoteBase(LoginRequiredMixin):
         return self.model.objects.filter(author=self.request.user)
 
 
+class AuthorPageCacheMixin:
+    """
+    Кэш страниц пользователя по версии его заметок.
+
+    Версию повышают представления, меняющие заметки, так что между
+    правками страницы отдаются без обращения к базе за заметками.
+    """
+
+    def dispatch(self, request, *args, **kwargs):
+        if request.method != 'GET' or not request.user.is_authenticated:
+            return super().dispatch(request, *args, **kwargs)
+        return get_cached_page(
+            request, partial(super().dispatch, request, *args, **kwargs)
+        )
+
+
 class NoteCreate(NoteBase, generic.CreateView):
     """Добавление заметки."""
     template_name = 'notes/form.html'
@@ -43,17 +72,157 @@ class NoteUpdate(NoteBase, generic.UpdateView):
     template_name = 'notes/form.html'
     form_class = NoteForm
 
+    def get_initial(self):
+        """Несохранённый черновик автосохранения поверх заметки."""
+        return {**super().get_initial(), **(get_draft(self.object) or {})}
+
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        context['autosave_interval'] = settings.NOTES_AUTOSAVE_INTERVAL
+        return context
+
+    def form_valid(self, form):
+        if not self.object.revisions.exists():
+            record_revision(self.get_queryset().get(pk=self.object.pk))
+        response = super().form_valid(form)
+        record_revision(self.object)
+        discard_draft(self.object)
+        return response
+
 
 class NoteDelete(NoteBase, generic.DeleteView):
     """Удаление заметки."""
     template_name = 'notes/delete.html'
 
+    def delete(self, request, *args, **kwargs):
+        self.object = self.get_object()
+        delete_with_tombstones([self.object])
+        return HttpResponseRedirect(self.get_success_url())
 
-class NotesList(NoteBase, generic.ListView):
+
+class NotesList(
+        ReadOnlyViewMixin, AuthorPageCacheMixin, NoteBase, generic.ListView
+):
     """Список всех заметок пользователя."""
     template_name = 'notes/list.html'
 
-
-class NoteDetail(NoteBase, generic.DetailView):
+    def get_queryset(self):
+        """
+        Одна страница заметок по курсору на id.
+
+        Загружаются только выводимые в списке поля. Граница страницы
+        ищется по индексу (author, id), а сама страница остаётся
+        queryset-ом без среза.
+        """
+        queryset = super().get_queryset().only(
+            'id', 'slug', 'title'
+        ).order_by('id')
+        try:
+            after = int(self.request.GET.get('after', 0))
+        except ValueError:
+            raise Http404('Некорректный курсор страницы.')
+        queryset = queryset.filter(id__gt=after)
+        per_page = settings.NOTES_COUNT_ON_PAGE
+        boundary = list(
+            queryset.values_list('id', flat=True)[per_page - 1:per_page + 1]
+        )
+        self.next_cursor = None
+        if boundary:
+            queryset = queryset.filter(id__lte=boundary[0])
+            if len(boundary) > 1:
+                self.next_cursor = boundary[0]
+        return queryset
+
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        context['next_cursor'] = self.next_cursor
+        return context
+
+
+class NoteDetail(
+        ReadOnlyViewMixin, AuthorPageCacheMixin, NoteBase, generic.DetailView
+):
     """Заметка подробно."""
     template_name = 'notes/detail.html'
+
+
+class NoteImport(LoginRequiredMixin, generic.FormView):
+    """Импорт заметок из файла JSON Lines или CSV."""
+    template_name = 'notes/import.html'
+    form_class = NoteImportForm
+    success_url = reverse_lazy('notes:success')
+
+    def form_valid(self, form):
+        records = read_records(
+            form.cleaned_data['file'], form.cleaned_data['format']
+        )
+        try:
+            import_notes(records, self.request.user)
+        except ValidationError as error:
+            form.add_error('file', error)
+            return self.form_invalid(form)
+        return super().form_valid(form)
+
+
+class NoteExport(NoteBase, generic.View):
+    """Выгрузка всех заметок пользователя потоком."""
+
+    def get(self, request, *args, **kwargs):
+        fmt = request.GET.get('format', 'jsonl')
+        if fmt not in CONTENT_TYPES:
+            raise Http404('Неизвестный формат выгрузки.')
+        response = StreamingHttpResponse(
+            export_notes(self.get_queryset(), fmt),
+            content_type=CONTENT_TYPES[fmt],
+        )
+        response['Content-Disposition'] = (
+            f'attachment; filename="notes.{fmt}"'
+        )
+        return response
+
+
+class NoteSearch(NoteBase, generic.ListView):
+    """Полнотекстовый поиск по заметкам пользователя."""
+    template_name = 'notes/search.html'
+
+    def get_queryset(self):
+        self.query = self.request.GET.get('q', '').strip()
+        if not self.query:
+            return []
+        return search_notes(
+            self.request.user, self.query, settings.NOTES_SEARCH_LIMIT
+        )
+
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        context['query'] = self.query
+        return context
+
+
+class NoteRevisions(NoteBase, generic.DetailView):
+    """История правок заметки."""
+    template_name = 'notes/revisions.html'
+
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        context['revisions'] = self.object.revisions.only(
+            'number', 'title', 'created_at'
+        )
+        return context
+
+
+class NoteRevisionRestore(
+    NoteBase, generic.detail.SingleObjectMixin, generic.View
+):
+    """Возврат заметки к одной из ревизий; возврат сам становится ревизией."""
+
+    def post(self, request, *args, **kwargs):
+        note = self.get_object()
+        revision = get_revision(note, kwargs['number'])
+        if revision is None:
+            raise Http404('Ревизия не найдена.')
+        note.title, note.text = revision
+        note.save()
+        record_revision(note)
+        discard_draft(note)
+        return HttpResponseRedirect(self.success_url)
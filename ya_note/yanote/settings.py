@@ -23,6 +23,9 @@ INSTALLED_APPS = [
 
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
+    'yanote.metrics.QueryMetricsMiddleware',
+    'yanote.profiling.SamplingProfilerMiddleware',
+    'yanote.slowlog.SlowQueryLogMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
@@ -54,11 +57,43 @@ WSGI_APPLICATION = 'yanote.wsgi.application'
 
 DATABASES = {
     'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
+        'ENGINE': 'yanote.sqlite3',
         'NAME': BASE_DIR / 'db.sqlite3',
-    }
+    },
+    'readonly': {
+        'ENGINE': 'yanote.sqlite3',
+        'NAME': (BASE_DIR / 'db.sqlite3').as_uri() + '?mode=ro',
+        'OPTIONS': {'uri': True},
+        'CONN_MAX_AGE': 60,
+        'TEST': {'MIRROR': 'default'},
+    },
+}
+DATABASE_ROUTERS = ['yanote.routers.ReadOnlyRouter']
+READ_ONLY_DATABASE = 'readonly'
+
+SQLITE_JOURNAL_MODE = 'wal'
+SQLITE_SYNCHRONOUS = 'normal'
+SQLITE_BUSY_TIMEOUT = 5000
+SQLITE_MMAP_SIZE = 64 * 1024 * 1024
+
+
+# Межпроцессные гарантии двухуровневого кэша, автосохранения и версий
+# страниц требуют общего кэша (Memcached, Redis); LocMem годится только
+# для одного процесса, и проверка yanote.W001 напоминает об этом.
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
 }
 
+SESSION_ENGINE = 'notes.sessions'
+AUTHENTICATION_BACKENDS = ['notes.auth.CachedModelBackend']
+AUTH_USER_CACHE_TIMEOUT = 60 * 5
+TWO_TIER_CACHE_SIZE = 1000
+TWO_TIER_CACHE_LOCAL_TIMEOUT = 5
+TWO_TIER_CACHE_LOCK_TIMEOUT = 10
+TWO_TIER_CACHE_EARLY_REFRESH_BETA = 1.0
+
 
 AUTH_PASSWORD_VALIDATORS = [
     {
@@ -87,3 +122,28 @@ DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
 LOGIN_URL = reverse_lazy('users:login')
 LOGIN_REDIRECT_URL = reverse_lazy('notes:home')
+
+NOTES_COUNT_ON_PAGE = 50
+NOTES_CACHE_TIMEOUT = 60 * 10
+NOTES_SEARCH_LIMIT = 50
+NOTES_IMPORT_BATCH_SIZE = 500
+NOTES_EXPORT_CHUNK_SIZE = 2000
+NOTES_API_BATCH_LIMIT = 500
+NOTES_AUTOSAVE_INTERVAL = 5
+NOTES_AUTOSAVE_LOCK_TIMEOUT = 2
+NOTES_TOMBSTONE_RETENTION = 60 * 60 * 24 * 30
+NOTES_TEXT_COMPRESSION = False
+NOTES_TEXT_COMPRESSION_THRESHOLD = 4096
+NOTES_REVISION_SNAPSHOT_EVERY = 20
+
+METRICS_ENABLED = False
+
+PROFILER_SAMPLE_RATE = 0
+PROFILER_HEADER = 'X-Profile'
+PROFILER_TOKEN = ''
+PROFILER_INTERVAL = 0.005
+PROFILER_DIR = BASE_DIR / 'profiles'
+PROFILER_MAX_FILES = 200
+
+SLOW_QUERY_THRESHOLD = None
+SLOW_QUERY_LOG = BASE_DIR / 'slow_queries.jsonl'
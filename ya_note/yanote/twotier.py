@@ -0,0 +1,285 @@
+"""
+Двухуровневый кэш: локальный LRU процесса перед общим кэшем Django.
+
+Локальный уровень ограничен по числу ключей (TWO_TIER_CACHE_SIZE) и по
+времени жизни (TWO_TIER_CACHE_LOCAL_TIMEOUT): удаление ключа в одном
+процессе снимает его из общего кэша сразу, а из локальных уровней
+других процессов — не позже чем через это время. Значения хранятся
+локально в pickle, как и в общем кэше, чтобы вызывающий код не мог
+поменять закэшированный объект.
+
+get_or_set пересчитывает отсутствующий ключ один раз на все процессы:
+внутри процесса вычисление защищено блокировкой ключа, между процессами —
+ключом-замком, занятым через cache.add, остальные ждут результата.
+Кроме того, запись может быть пересчитана заранее, до истечения срока,
+с вероятностью, растущей к концу срока и с временем вычисления
+(XFetch, коэффициент TWO_TIER_CACHE_EARLY_REFRESH_BETA; 0 отключает).
+Счётчики попаданий, промахов и вытеснений отдаются в метриках.
+
+Всё сказанное о других процессах верно, только если общий уровень —
+действительно общий кэш. С LocMem у каждого процесса свой «общий»
+уровень; проверка yanote.W001 предупреждает об этом при DEBUG = False.
+"""
+import math
+import pickle
+import random
+import threading
+import time
+from collections import Counter, OrderedDict
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.core import checks
+from django.core.cache import DEFAULT_CACHE_ALIAS, caches
+from django.core.cache.backends.base import DEFAULT_TIMEOUT
+
+MISSING = object()
+LOCK_KEY = '{key}:lock'
+WAIT_INTERVAL = 0.01
+EVENTS = (
+    'local_hit', 'shared_hit', 'miss', 'eviction', 'early_refresh', 'wait'
+)
+
+REGISTRY = {}
+
+
+class Uncacheable(Exception):
+    """Вычисленное значение нельзя кэшировать; args[0] — само значение."""
+
+
+class TwoTierCache:
+
+    def __init__(self, name, alias=DEFAULT_CACHE_ALIAS):
+        self.name = name
+        self.alias = alias
+        self.local = OrderedDict()
+        self.lock = threading.Lock()
+        self.flights = {}
+        self.stats = Counter()
+        REGISTRY[name] = self
+
+    @property
+    def shared(self):
+        return caches[self.alias]
+
+    def count(self, event):
+        with self.lock:
+            self.stats[event] += 1
+
+    @contextmanager
+    def flight_lock(self, key):
+        """
+        Блокировка вычисления одного ключа внутри процесса.
+
+        Замок создаётся на время, пока его ждёт хотя бы один поток,
+        поэтому долгое вычисление не задерживает другие ключи.
+        """
+        with self.lock:
+            lock, waiting = self.flights.get(key, (None, 0))
+            if lock is None:
+                lock = threading.Lock()
+            self.flights[key] = (lock, waiting + 1)
+        try:
+            with lock:
+                yield
+        finally:
+            with self.lock:
+                _, waiting = self.flights[key]
+                if waiting > 1:
+                    self.flights[key] = (lock, waiting - 1)
+                else:
+                    del self.flights[key]
+
+    def get_local(self, key):
+        with self.lock:
+            entry = self.local.get(key)
+            if entry is None:
+                return MISSING
+            expires, data = entry
+            if expires < time.monotonic():
+                del self.local[key]
+                return MISSING
+            self.local.move_to_end(key)
+        return pickle.loads(data)
+
+    def set_local(self, key, entry, timeout=DEFAULT_TIMEOUT):
+        local_timeout = settings.TWO_TIER_CACHE_LOCAL_TIMEOUT
+        if timeout is not DEFAULT_TIMEOUT and timeout is not None:
+            local_timeout = min(local_timeout, timeout)
+        data = pickle.dumps(entry, pickle.HIGHEST_PROTOCOL)
+        with self.lock:
+            self.local[key] = (time.monotonic() + local_timeout, data)
+            self.local.move_to_end(key)
+            while len(self.local) > settings.TWO_TIER_CACHE_SIZE:
+                self.local.popitem(last=False)
+                self.stats['eviction'] += 1
+
+    def get_entry(self, key):
+        """
+        Запись (значение, срок по time.time(), время вычисления).
+
+        Сначала ищется в локальном уровне, затем в общем кэше.
+        """
+        entry = self.get_local(key)
+        if entry is not MISSING:
+            self.count('local_hit')
+            return entry
+        entry = self.shared.get(key, MISSING)
+        if entry is MISSING:
+            self.count('miss')
+            return entry
+        self.count('shared_hit')
+        self.set_local(key, entry)
+        return entry
+
+    def set_entry(self, key, value, timeout=DEFAULT_TIMEOUT, delta=0):
+        if timeout is DEFAULT_TIMEOUT:
+            timeout = self.shared.default_timeout
+        expires = math.inf if timeout is None else time.time() + timeout
+        entry = (value, expires, delta)
+        self.shared.set(key, entry, timeout)
+        self.set_local(key, entry, timeout)
+
+    def get(self, key, default=None):
+        entry = self.get_entry(key)
+        return default if entry is MISSING else entry[0]
+
+    def set(self, key, value, timeout=DEFAULT_TIMEOUT):
+        self.set_entry(key, value, timeout)
+
+    def delete(self, key):
+        with self.lock:
+            self.local.pop(key, None)
+        self.shared.delete(key)
+
+    def clear_local(self):
+        with self.lock:
+            self.local.clear()
+
+    def __contains__(self, key):
+        return self.get(key, MISSING) is not MISSING
+
+    def is_stale(self, entry):
+        """Пора ли пересчитать запись заранее (XFetch)."""
+        _, expires, delta = entry
+        beta = settings.TWO_TIER_CACHE_EARLY_REFRESH_BETA
+        if not beta or not delta or expires == math.inf:
+            return False
+        return (
+            time.time() - delta * beta * math.log(1 - random.random())
+            >= expires
+        )
+
+    def get_or_set(self, key, compute, timeout=DEFAULT_TIMEOUT):
+        """
+        Значение ключа или результат compute(), вычисленный один раз.
+
+        Пока другой процесс пересчитывает устаревшую заранее запись,
+        отдаётся старое значение; отсутствующего значения ждут не дольше
+        TWO_TIER_CACHE_LOCK_TIMEOUT секунд, после чего вычисляют сами.
+        compute может бросить Uncacheable, чтобы вернуть значение
+        без записи в кэш.
+        """
+        entry = self.get_entry(key)
+        if entry is not MISSING and not self.is_stale(entry):
+            return entry[0]
+        with self.flight_lock(key):
+            current = self.get_local(key)
+            if current is MISSING:
+                current = self.shared.get(key, MISSING)
+            if current is not MISSING and (
+                    entry is MISSING or current[1] != entry[1]
+            ):
+                # Пока ждали блокировку, значение вычислил другой поток.
+                return current[0]
+            if entry is not MISSING:
+                self.count('early_refresh')
+            lock_timeout = settings.TWO_TIER_CACHE_LOCK_TIMEOUT
+            lock_key = LOCK_KEY.format(key=key)
+            locked = self.shared.add(lock_key, True, lock_timeout)
+            if not locked:
+                if entry is not MISSING:
+                    return entry[0]
+                entry = self.wait(key, lock_timeout)
+                if entry is not MISSING:
+                    return entry[0]
+            try:
+                return self.compute(key, compute, timeout)
+            finally:
+                if locked:
+                    self.shared.delete(lock_key)
+
+    def wait(self, key, lock_timeout):
+        """
+        Ждёт, пока значение вычислит владелец замка.
+
+        Если замок снят, а значения нет (владелец упал или получил
+        Uncacheable), ждать дальше нечего и вычислять придётся самим.
+        Замок проверяется до чтения значения: владелец пишет значение
+        раньше, чем снимает замок, поэтому запись не проскочит мимо.
+        """
+        self.count('wait')
+        lock_key = LOCK_KEY.format(key=key)
+        deadline = time.monotonic() + lock_timeout
+        while time.monotonic() < deadline:
+            time.sleep(WAIT_INTERVAL)
+            released = self.shared.get(lock_key) is None
+            entry = self.shared.get(key, MISSING)
+            if entry is not MISSING:
+                self.set_local(key, entry)
+                return entry
+            if released:
+                break
+        return MISSING
+
+    def compute(self, key, compute, timeout):
+        started = time.perf_counter()
+        try:
+            value = compute()
+        except Uncacheable as error:
+            return error.args[0]
+        self.set_entry(key, value, timeout, time.perf_counter() - started)
+        return value
+
+
+PROCESS_LOCAL_BACKENDS = (
+    'django.core.cache.backends.locmem.LocMemCache',
+    'django.core.cache.backends.dummy.DummyCache',
+)
+
+
+@checks.register(checks.Tags.caches)
+def check_shared_cache(app_configs, **kwargs):
+    """Межпроцессные гарантии требуют общего кэша вне отладки."""
+    if settings.DEBUG:
+        return []
+    aliases = sorted({cache.alias for cache in REGISTRY.values()})
+    return [
+        checks.Warning(
+            f'Кэш {alias!r} локален для процесса: двухуровневый кэш не '
+            'сможет сбрасывать записи и вычислять ключи один раз между '
+            'процессами.',
+            hint='Укажите в CACHES общий бэкенд, например Memcached.',
+            id='yanote.W001',
+        )
+        for alias in aliases
+        if settings.CACHES[alias]['BACKEND'] in PROCESS_LOCAL_BACKENDS
+    ]
+
+
+def render_metrics():
+    """Счётчики всех двухуровневых кэшей в формате Prometheus."""
+    name = 'two_tier_cache_events_total'
+    lines = [
+        f'# HELP {name} События двухуровневых кэшей',
+        f'# TYPE {name} counter',
+    ]
+    for cache_name, cache in sorted(REGISTRY.items()):
+        with cache.lock:
+            stats = dict(cache.stats)
+        lines += [
+            f'{name}{{cache="{cache_name}",event="{event}"}} '
+            f'{stats.get(event, 0)}'
+            for event in EVENTS
+        ]
+    return '\n'.join(lines) + '\n'